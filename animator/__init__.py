@@ -1,30 +1,35 @@
 "NeoPixel Animation Library"
 
-import math
-import random
-import time
+import dataclasses
 from dataclasses import dataclass, field
-import logging
-
-try:
-    import neopixel
-except NotImplementedError as e:
-    logging.error(f"Error importing NeoPixel driver {repr(e)}. If you are using the emulator, you can ignore this message.")
-
-import neopixel_emu
+import importlib.util
+import time
 
 from . import light_funcs
-from . import _firework
+from . import fixed_funcs
+from . import _pixelbuf
 from ._firework import FireworkArgs
-
-COLORS = [
-    (255, 0, 0),  # Red
-    (0, 255, 0),  # Green
-    (255, 255, 0),  # Yellow
-    (0, 0, 255),  # Blue
-    (255, 127, 0),  # Orange
-    (0, 0, 0),  # Off
-]
+from .recording import PlaybackArgs
+from .effects import (
+    COLORS,
+    SLOW_FPS,
+    BASIC_FPS,
+    REGULAR_FPS,
+    FAST_FPS,
+    UFAST_FPS,
+    EFFECTS,
+    Effect,
+    Off,
+    generate_color_pattern,
+    register_effect,
+)
+from .calibration import IDENTITY, Calibration, channel_tables
+from .framebuffer import FrameBuffer
+from .governor import FrameRateGovernor
+from .metrics import FrameMetrics
+from .pipeline import FramePipeline
+from .scheduler import FrameScheduler
+from .framecache import FrameCache, freeze
 
 
 @dataclass
@@ -83,40 +88,7 @@ class AnimationArgs:
     wipe: WipeArgs = field(default_factory=WipeArgs)
     random: RandomArgs = field(default_factory=RandomArgs)
     firework: FireworkArgs = field(default_factory=FireworkArgs)
-
-
-# Set the desired FPS for your animation
-SLOW_FPS = 5
-BASIC_FPS = 30
-REGULAR_FPS = 45
-FAST_FPS = 60
-UFAST_FPS = 120
-
-
-# Animation-specific functions
-def generate_color_pattern(length: int) -> list:
-    """Generate list of colors for ColoredLights animation
-
-    Args:
-        length (int): Length of output
-
-    Returns:
-        list: Output
-    """
-    colors = [
-        (255, 0, 0),  # Red
-        (0, 255, 0),  # Green
-        (255, 255, 0),  # Yellow
-        (0, 0, 255),  # Blue
-        (255, 165, 0),  # Orange
-    ]
-
-    pattern = []
-
-    while len(pattern) < length:
-        pattern.extend(colors)
-
-    return pattern[:length]
+    playback: PlaybackArgs = field(default_factory=PlaybackArgs)
 
 
 class Animator:
@@ -127,187 +99,200 @@ class Animator:
         num_pixels: int,
         animation_state: AnimationState,
         animation_args: AnimationArgs,
+        use_numpy: bool = True,
+        frame_cache_size: int = 0,
+        calibration: Calibration | None = None,
+        pipeline: int = 0,
+        frame_rate: float = 0.0,
+        speed: float = 1.0,
+        fixed_point: bool = False,
     ) -> None:
         super().__init__()
         self.pixels = pixels
         self.num_pixels = num_pixels
+        # effects draw here, copied to the pixels once per frame
+        self.frame = FrameBuffer(
+            num_pixels, pixels.byteorder if _pixelbuf.supports_bulk(pixels) else "RGB"
+        )
         self.animation_state = animation_state
         self.animation_args = animation_args
-
-        self.animation_step = 1
-        self.previous_animation = ""
-
-        self.swipe_stage = 0
-
-    def cycle(self) -> None:
-        """Run one cycle of the animation"""
-        if (
-            self.previous_animation != self.animation_state.effect
-        ):  # reset animaton data
-            self.pixels.fill((0, 0, 0))
-
-            self.previous_animation = self.animation_state.effect
-            self.animation_step = 1
-            self.swipe_stage = 0
-
-        # Set NeoPixels based on the "SingleColor" effect
-        if (
-            self.animation_state.effect == "SingleColor"
-            and self.animation_state.state == "ON"
-        ):
-            self.pixels.fill(self.animation_args.single_color.color)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / BASIC_FPS)
-        elif (
-            self.animation_state.effect == "Rainbow"
-            and self.animation_state.state == "ON"
-        ):
-            for i in range(self.num_pixels):
-                pixel_index = (i * 256 // self.num_pixels) + self.animation_step
-                self.pixels[i] = light_funcs.wheel(pixel_index & 255)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "GlitterRainbow"
-            and self.animation_state.state == "ON"
-        ):
-            for i in range(self.num_pixels):
-                pixel_index = (i * 256 // self.num_pixels) + self.animation_step
-                self.pixels[i] = light_funcs.wheel(pixel_index & 255)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            for i in range(math.floor(self.animation_args.glitter_rainbow.glitter_ratio * self.num_pixels)):
-                led = random.randint(0, self.num_pixels - 1)
-                self.pixels[led] = (255, 255, 255)
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "Colorloop"
-            and self.animation_state.state == "ON"
-        ):
-            self.pixels.fill(light_funcs.wheel(self.animation_step))
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "Magic"
-            and self.animation_state.state == "ON"
-        ):
+        # whole-frame NumPy renderers, falls back to per-pixel rendering without NumPy,
+        # which is only imported once an effect uses it
+        self.use_numpy = use_numpy and importlib.util.find_spec("numpy") is not None
+        # integer math in effects that have it, see fixed_funcs, for boards without a fast FPU
+        self.fixed_point = fixed_point
+        # LRU cache of frames of periodic effects, size in bytes, 0 disables it
+        self.frame_cache = FrameCache(frame_cache_size)
+        self._cached_args: dict = {}
+        # gamma and white balance, applied with brightness through per-channel tables
+        self.calibration = calibration or Calibration()
+        self._tables: tuple | None = None  # None while they change nothing
+        self._tables_key: tuple | None = None
+
+        self.effect_name: str | None = None  # None while the strip is off
+        self.effect: Effect = Off(self)
+        self.changed = False  # last render() changed the pixels
+        self._static_key: tuple | None = None
+        self._blit_key: tuple | None = None  # brightness and calibration last blitted
+
+        self.scheduler = FrameScheduler()
+        self.metrics = FrameMetrics()  # of the current effect
+
+        # frames per second of every effect, 0 for the rate each effect was designed for;
+        # effects move on with time, so this only trades smoothness for CPU time
+        self.frame_rate = frame_rate
+        self.speed = speed  # animation speed, 1 is the speed effects were designed for
+        # effects move on by the time elapsed on the scheduler clock between frames,
+        # False moves them on one frame period per frame, for recording
+        self.realtime = True
+        self._last_frame: float | None = None
+        # caps the frame rate to what the CPU keeps up with, see FrameRateGovernor
+        self.governor: FrameRateGovernor | None = None
+
+        # buffers of frames transmitted on an output thread, 0 transmits in show()
+        self.pipeline: FramePipeline | None = None
+        if pipeline and _pixelbuf.supports_bulk(pixels):
+            self.pipeline = FramePipeline(pixels, pipeline, metrics=self.metrics)
+
+    @property
+    def fps(self) -> float:
+        """Target frame rate, within the cap of the governor"""
+        fps = self.frame_rate or self.effect.fps
+        return fps if self.governor is None else self.governor.limit(fps)
+
+    @property
+    def idle(self) -> bool:
+        """Nothing left to draw until the state or args change"""
+        return self.effect.static and not self.changed
+
+    def _switch_effect(self, name: str | None) -> None:
+        """Tear down the current effect and set up a new one
+
+        Args:
+            name (str | None): Effect name, None to turn the strip off
+        """
+        self.effect.teardown()
+        self.frame.fill((0, 0, 0))
+
+        self.effect_name = name
+        self.effect = EFFECTS.get(name, Off)(self)
+        self.effect.setup()
+        self._static_key = None
+        self._blit_key = None
+        self._last_frame = None
+        self.metrics.reset()
+
+    def invalidate(self) -> None:
+        """Redraw on the next render, also for static effects whose frame changed from outside"""
+        self._static_key = None
+
+    @staticmethod
+    def _args_key(effect: Effect) -> tuple:
+        """Hashable copy of the options of an effect"""
+        if effect.args_name is None:
+            return ()
+        return freeze(dataclasses.astuple(effect.args))
+
+    def _frame_cache_key(self) -> tuple | None:
+        """Key of the current frame in the frame cache, None if it can not be cached"""
+        effect = self.effect
+        if self.frame_cache.max_size <= 0 or not effect.cacheable:
+            return None
+
+        args = self._args_key(effect)
+        if self._cached_args.get(effect.name, args) != args:  # options changed over MQTT
+            self.frame_cache.invalidate(effect.name)
+        self._cached_args[effect.name] = args
+        return (effect.name, self.num_pixels, effect.step, args)
+
+    def _blit(self) -> None:
+        """Copy the frame to the pixels, with brightness and calibration in one pass per channel"""
+        if not _pixelbuf.supports_bulk(self.pixels):  # no gamma or white balance
             for i in range(self.num_pixels):
-                pixel_index = (i * 256 // self.num_pixels) + self.animation_step
-                color = float(math.sin(pixel_index / 4 - self.num_pixels))
-                # convert the -1 to 1 to 110 to 180
-                color = light_funcs.map_range(color, -1, 1, 120, 200)
-                self.pixels[i] = light_funcs.wheel(int(color) & 255)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / BASIC_FPS)
-        elif (
-            self.animation_state.effect == "Fire" and self.animation_state.state == "ON"
-        ):
-            for i in range(self.num_pixels):
-                pixel_index = (i * 256 // self.num_pixels) + self.animation_step
-                color = float(math.sin(pixel_index / 4 - self.num_pixels))
-                # convert the -1 to 1 to 110 to 180
-                color = light_funcs.map_range(color, -1, 1, 70, 85)
-                self.pixels[i] = light_funcs.wheel(int(color) & 255)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / REGULAR_FPS)
-        elif (
-            self.animation_state.effect == "ColoredLights"
-            and self.animation_state.state == "ON"
-        ):
-            for index, color in enumerate(generate_color_pattern(self.num_pixels)):
-                self.pixels[index - 1] = color
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / BASIC_FPS)
-        elif (
-            self.animation_state.effect == "Fade" and self.animation_state.state == "ON"
-        ):
-            self.pixels.fill(
-                light_funcs.round_tuple(
-                    light_funcs.mix_colors(
-                        self.animation_args.fade.colora,
-                        self.animation_args.fade.colorb,
-                        math.sin((self.animation_step / 255) * math.pi),
-                    )
-                )
+                self.pixels[i] = self.frame[i]
+            self.pixels.brightness = self.effect.brightness
+            return
+
+        key = (self.effect.brightness, self.calibration)
+        if key != self._tables_key:  # rebuilt on brightness or calibration changes only
+            tables = channel_tables(self.calibration, self.effect.brightness, self.frame.order)
+            self._tables = None if all(table == IDENTITY for table in tables) else tables
+            self._tables_key = key
+        _pixelbuf.write_frame(self.pixels, self.frame.buffer, self._tables)
+
+    def render(self) -> None:
+        """Render the next frame into the pixels without showing it
+
+        Sets changed to False if the frame is the same as the last one.
+        """
+        name = self.animation_state.effect if self.animation_state.state == "ON" else None
+        if name != self.effect_name:
+            self._switch_effect(name)
+
+        if self.effect.static:
+            static_key = (
+                self._args_key(self.effect), self.animation_state.brightness, self.calibration
             )
-            self.pixels.show()
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "Flash"
-            and self.animation_state.state == "ON"
-        ):
-            if (
-                light_funcs.square_wave(self.animation_step, self.animation_args.flash.speed, 1)
-                == 1
-            ):
-                self.pixels.fill(self.animation_args.flash.colora)
-            else:
-                self.pixels.fill(self.animation_args.flash.colorb)
-
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / BASIC_FPS)
-        elif (
-            self.animation_state.effect == "Wipe" and self.animation_state.state == "ON"
-        ):
-            for _ in range(self.animation_args.wipe.leds_iter):
-                if self.swipe_stage == 0:
-                    last_pixel = light_funcs.rindex(
-                        list(self.pixels), list(self.animation_args.wipe.colora)
-                    )
-                    if last_pixel is None:
-                        last_pixel = -1
-
-                    if last_pixel + 2 > self.num_pixels:
-                        self.swipe_stage = 1
-                    else:
-                        self.pixels[last_pixel + 1] = self.animation_args.wipe.colora
-                else:
-                    last_pixel = light_funcs.rindex(
-                        list(self.pixels), list(self.animation_args.wipe.colorb)
-                    )
-                    if last_pixel is None:
-                        last_pixel = -1
-
-                    if last_pixel + 2 > self.num_pixels:
-                        self.swipe_stage = 0
-                    else:
-                        self.pixels[last_pixel + 1] = self.animation_args.wipe.colorb
-
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "Firework"
-            and self.animation_state.state == "ON"
-        ):
-            _firework.firework_step(self.animation_args.firework, self.pixels)
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / FAST_FPS)
-        elif (
-            self.animation_state.effect == "Random"
-            and self.animation_state.state == "ON"
-        ):
-            for i in range(self.num_pixels):
-                self.pixels[i] = (
-                    self.animation_args.random.color if random.randint(0, 1) == 1 else (0, 0, 0)
-                )
-
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / SLOW_FPS)
-        elif (
-            self.animation_state.effect == "RandomColor"
-            and self.animation_state.state == "ON"
-        ):
-            for i in range(self.num_pixels):
-                self.pixels[i] = COLORS[random.randint(0, 5)]
+            if static_key == self._static_key:
+                self.changed = False
+                return
+            self._static_key = static_key
+        self.changed = True
+        start = time.perf_counter()
+
+        now = self.scheduler.clock()
+        if self._last_frame is not None:  # the first frame of an effect is at phase 0
+            elapsed = now - self._last_frame if self.realtime else 1 / self.fps
+            self.effect.advance(elapsed * self.speed)
+        self._last_frame = now
+
+        frame_key = self._frame_cache_key()
+        cached_frame = None if frame_key is None else self.frame_cache.get(frame_key)
+        if cached_frame is not None:
+            self.frame.write_array(0, cached_frame)
+        elif self.effect.render() is False and self._blit_key == (
+            self.effect.brightness, self.calibration
+        ):  # the effect held its frame, the pixels already show it
+            self.changed = False
+            return
+        self._blit()
+        self._blit_key = (self.effect.brightness, self.calibration)
+
+        if frame_key is not None and cached_frame is None:
+            self.frame_cache.put(frame_key, bytes(self.frame.buffer))
+
+        self.metrics.render.add(time.perf_counter() - start)
+        self.metrics.frame()
+
+    def show(self) -> None:
+        """Show the pixels, timing it, or hand them to the pipeline which times the transmit"""
+        if self.pipeline is not None:
+            self.pipeline.submit()
+            return
+        start = time.perf_counter()
+        self.pixels.show()
+        self.metrics.show.add(time.perf_counter() - start)
 
-            self.pixels.brightness = self.animation_state.brightness / 255.0
-            time.sleep(1 / SLOW_FPS)
-        else:  # off state / animation unknown
-            self.pixels.fill((0, 0, 0))
-            self.pixels.brightness = 0.0
-            time.sleep(1 / BASIC_FPS)
+    def _render_and_show(self) -> None:
+        start = time.perf_counter()
+        self.render()
+        if not self.changed:
+            return
+        self.show()
+        if self.governor is not None:
+            self.governor.add(time.perf_counter() - start)
 
-        self.pixels.show()
-        self.animation_step += 1
-        if self.animation_step > 255:
-            self.animation_step = 1
+    def cycle(self) -> None:
+        """Run one cycle of the animation"""
+        self._render_and_show()
+        start = time.perf_counter()
+        self.scheduler.wait(self.fps)
+        self.metrics.sleep.add(time.perf_counter() - start)
+
+    async def cycle_async(self) -> None:
+        """Run one cycle of the animation, awaiting the next frame instead of sleeping"""
+        import asyncio  # pylint: disable=import-outside-toplevel
+        self._render_and_show()
+        start = time.perf_counter()
+        await asyncio.sleep(self.scheduler.advance(self.fps))
+        self.metrics.sleep.add(time.perf_counter() - start)
@@ -1,93 +1,182 @@
 import random
+from array import array
 from dataclasses import dataclass
 
-try:
-    import neopixel
-except NotImplementedError:
-    pass
+# Spark kinds
+LAUNCH = 0  # trail behind a rising flare
+BURST = 1  # explosion spark
+KNOWN = 2  # the hottest explosion spark, the explosion is over when it fades
 
-import neopixel_emu
 
 @dataclass
 class FireworkArgs:
-    num_sparks: int = 60
+    num_sparks: int = 60  # spark capacity shared by all fireworks
     gravity: float = -0.004
     brightness_decay: float = 0.985
     flare_min_vel: float = 0.5
     flare_max_vel: float = 0.9
     c1: float = 120
     c2: float = 50
+    max_fireworks: int = 1  # fireworks in the air at the same time
+    launch_chance: float = 0.02  # chance per frame to launch another one while others are active
 
-def firework_step(settings: FireworkArgs, pixels: 'neopixel_emu.NeoPixel | neopixel.NeoPixel'):
-    # Reference: http://www.anirama.com/1000leds/1d-fireworks/
-    
-    sparkPos = [0.0] * settings.num_sparks
-    sparkVel = [0.0] * settings.num_sparks
-    sparkCol = [0.0] * settings.num_sparks
-
-    flarePos = 0
-    flareVel = random.uniform(settings.flare_min_vel, settings.flare_max_vel)
-    brightness = 1.0
-
-    # Initialize launch sparks
-    for i in range(5):
-        sparkPos[i] = 0
-        sparkVel[i] = (random.uniform(0, 1) / 255) * (flareVel / 5)
-        sparkCol[i] = sparkVel[i] * 1000
-        sparkCol[i] = max(0, min(255, sparkCol[i]))
-
-    # Launch
-    pixels.fill((0, 0, 0))
-    while flareVel >= -0.2:
-        # Sparks
-        for i in range(5):
-            sparkPos[i] += sparkVel[i]
-            sparkPos[i] = max(0, min(pixels.n, sparkPos[i]))
-            sparkVel[i] += settings.gravity
-            sparkCol[i] += -0.8
-            sparkCol[i] = max(0, min(255, sparkCol[i]))
-            if 0 <= int(sparkPos[i]) < pixels.n:
-                color = (int(sparkCol[i]), int(sparkCol[i] * 0.5), 0)  # Using a warm color similar to HeatColor
-                pixels[int(sparkPos[i])] = (color[0] // 5, color[1] // 5, color[2] // 5)  # Reduce brightness
-
-        # Flare
-        if 0 <= int(flarePos) < pixels.n:
-            pixels[int(flarePos)] = (int(brightness * 255), int(brightness * 255), int(brightness * 255))
-        pixels.show()
-        pixels.fill((0, 0, 0))
-        flarePos += flareVel
-        flareVel += settings.gravity
-        brightness *= settings.brightness_decay
-
-    # Explode!
-    nSparks = int(flarePos / 2)
-    for i in range(nSparks):
-        sparkPos[i] = flarePos
-        sparkVel[i] = (random.uniform(0, 2) - 1)
-        sparkCol[i] = abs(sparkVel[i]) * 500
-        sparkCol[i] = max(0, min(255, sparkCol[i]))
-        sparkVel[i] *= flarePos / pixels.n
-
-    sparkCol[0] = 255  # This will be our known spark
-    dying_gravity = settings.gravity
-    while sparkCol[0] > settings.c2 / 128:
+
+class Flare:
+    """Rising firework before it explodes"""
+    __slots__ = ("pos", "vel", "brightness")
+
+    def __init__(self, vel: float) -> None:
+        self.pos = 0.0
+        self.vel = vel
+        self.brightness = 1.0
+
+
+class FireworkEngine:
+    """Resumable 1D firework particle system, advanced one frame per step()
+
+    Reference: http://www.anirama.com/1000leds/1d-fireworks/
+
+    Sparks of every firework share fixed-size struct-of-arrays storage,
+    FireworkArgs.num_sparks is its capacity.
+    """
+
+    def __init__(self, settings: FireworkArgs) -> None:
+        self.flares: list[Flare] = []
+        self.count = 0
+        self._allocate(settings.num_sparks)
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.count = 0
+        self.spark_pos = array("f", bytes(4 * capacity))
+        self.spark_vel = array("f", bytes(4 * capacity))
+        self.spark_col = array("f", bytes(4 * capacity))
+        self.spark_gravity = array("f", bytes(4 * capacity))
+        self.spark_kind = bytearray(capacity)
+
+    def reset(self) -> None:
+        """Remove every firework"""
+        self.flares.clear()
+        self.count = 0
+
+    @property
+    def active(self) -> int:
+        """Number of fireworks rising or exploding"""
+        return len(self.flares) + self.spark_kind[:self.count].count(KNOWN)
+
+    def _add_spark(self, kind: int, pos: float, vel: float, col: float, gravity: float) -> None:
+        if self.count >= self.capacity:
+            return
+        i = self.count
+        self.spark_pos[i] = pos
+        self.spark_vel[i] = vel
+        self.spark_col[i] = max(0, min(255, col))
+        self.spark_gravity[i] = gravity
+        self.spark_kind[i] = kind
+        self.count += 1
+
+    def _remove_spark(self, i: int) -> None:
+        last = self.count - 1
+        self.spark_pos[i] = self.spark_pos[last]
+        self.spark_vel[i] = self.spark_vel[last]
+        self.spark_col[i] = self.spark_col[last]
+        self.spark_gravity[i] = self.spark_gravity[last]
+        self.spark_kind[i] = self.spark_kind[last]
+        self.count = last
+
+    def launch(self, settings: FireworkArgs) -> None:
+        """Launch a new firework
+
+        Args:
+            settings (FireworkArgs): Firework options
+        """
+        flare = Flare(random.uniform(settings.flare_min_vel, settings.flare_max_vel))
+        self.flares.append(flare)
+        for _ in range(5):
+            vel = (random.uniform(0, 1) / 255) * (flare.vel / 5)
+            self._add_spark(LAUNCH, 0, vel, vel * 1000, settings.gravity)
+
+    def _explode(self, settings: FireworkArgs, flare: Flare, num_pixels: int) -> None:
+        if self.count >= self.capacity:
+            # active counts explosions by their KNOWN spark, it takes the place of another
+            # kind of spark so that a full storage can not hide one and launch too many
+            for i in range(self.count):
+                if self.spark_kind[i] != KNOWN:
+                    self._remove_spark(i)
+                    break
+        for i in range(max(1, int(flare.pos / 2))):
+            vel = random.uniform(0, 2) - 1
+            col = 255 if i == 0 else abs(vel) * 500
+            self._add_spark(
+                KNOWN if i == 0 else BURST,
+                flare.pos,
+                vel * flare.pos / num_pixels,
+                col,
+                settings.gravity,
+            )
+
+    def step(self, settings: FireworkArgs, pixels) -> None:
+        """Render the next frame
+
+        Args:
+            settings (FireworkArgs): Firework options
+            pixels (FrameBuffer | neopixel_emu.NeoPixel | neopixel.NeoPixel): Pixels to draw on
+        """
+        if settings.num_sparks != self.capacity:  # capacity changed over MQTT
+            self.reset()
+            self._allocate(settings.num_sparks)
+
+        active = self.active
+        # every firework needs a slot for its KNOWN spark once it explodes
+        if active < min(settings.max_fireworks, self.capacity) and (
+            active == 0 or random.random() < settings.launch_chance
+        ):
+            self.launch(settings)
+
+        num_pixels = len(pixels)
         pixels.fill((0, 0, 0))
-        for i in range(nSparks):
-            sparkPos[i] += sparkVel[i]
-            sparkPos[i] = max(0, min(pixels.n, sparkPos[i]))
-            sparkVel[i] += dying_gravity
-            sparkCol[i] *= 0.99
-            sparkCol[i] = max(0, min(255, sparkCol[i]))
-
-            if 0 <= int(sparkPos[i]) < pixels.n:
-                if sparkCol[i] > settings.c1:
-                    pixels[int(sparkPos[i])] = (255, 255, int(255 * (sparkCol[i] - settings.c1) / (255 - settings.c1)))
-                elif sparkCol[i] < settings.c2:
-                    pixels[int(sparkPos[i])] = (int(255 * sparkCol[i] / settings.c2), 0, 0)
+
+        pos = self.spark_pos
+        vel = self.spark_vel
+        col = self.spark_col
+        gravity = self.spark_gravity
+        kind = self.spark_kind
+        c1 = settings.c1
+        c2 = settings.c2
+        i = 0
+        while i < self.count:
+            pos[i] = max(0, min(num_pixels, pos[i] + vel[i]))
+            vel[i] += gravity[i]
+            if kind[i] == LAUNCH:
+                col[i] = max(0, col[i] - 0.8)
+                if col[i] <= 0:
+                    self._remove_spark(i)
+                    continue
+                heat = int(col[i])
+                color = (heat // 5, int(heat * 0.5) // 5, 0)  # warm color similar to HeatColor
+            else:
+                gravity[i] *= 0.995
+                col[i] *= 0.99
+                if col[i] <= c2 / 128:
+                    self._remove_spark(i)
+                    continue
+                if col[i] > c1:
+                    color = (255, 255, int(255 * (col[i] - c1) / (255 - c1)))
+                elif col[i] < c2:
+                    color = (int(255 * col[i] / c2), 0, 0)
                 else:
-                    pixels[int(sparkPos[i])] = (255, int(255 * (sparkCol[i] - settings.c2) / (settings.c1 - settings.c2)), 0)
+                    color = (255, int(255 * (col[i] - c2) / (c1 - c2)), 0)
+
+            if int(pos[i]) < num_pixels:
+                pixels[int(pos[i])] = color
+            i += 1
 
-        dying_gravity *= 0.995
-        pixels.show()
-    pixels.fill((0, 0, 0))
-    pixels.show()
+        for flare in list(self.flares):
+            if 0 <= int(flare.pos) < num_pixels:
+                pixels[int(flare.pos)] = (int(flare.brightness * 255),) * 3
+            flare.pos += flare.vel
+            flare.vel += settings.gravity
+            flare.brightness *= settings.brightness_decay
+            if flare.vel < -0.2:
+                self.flares.remove(flare)
+                self._explode(settings, flare, num_pixels)
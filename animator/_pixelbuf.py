@@ -0,0 +1,78 @@
+"Bulk access to adafruit_pixelbuf buffers"
+
+import functools
+
+
+def supports_bulk(pixels) -> bool:
+    """Check if a whole frame can be copied straight into the pixel buffers
+
+    Args:
+        pixels (neopixel.NeoPixel | neopixel_emu.NeoPixel): Pixel object
+
+    Returns:
+        bool: True for adafruit_pixelbuf based drivers outside of dotstar mode
+    """
+    return hasattr(pixels, "_post_brightness_buffer") and not getattr(
+        pixels, "_dotstar_mode", False
+    )
+
+
+@functools.lru_cache(maxsize=16)  # brightness sliders go through many values
+def brightness_lut(brightness: float) -> bytes:
+    """Translation table that scales a byte by brightness like pixelbuf does
+
+    Args:
+        brightness (float): 0 to 1. Brightness
+
+    Returns:
+        bytes: 256 entry table for bytes.translate
+    """
+    return bytes(int(i * brightness) for i in range(256))
+
+
+def write_native(pixels, data, index: int = 0) -> None:
+    """Copy a whole frame, or a run of pixels, into the pixel buffers in one pass
+
+    Args:
+        pixels (neopixel.NeoPixel | neopixel_emu.NeoPixel): Pixel object, see supports_bulk
+        data (bytes-like): Pixel data in the strip's byte order, pixels.bpp bytes per pixel
+        index (int, optional): First pixel to write. Defaults to 0.
+    """
+    # pylint: disable=protected-access
+    start = pixels._offset + index * pixels._bpp
+    end = start + len(data)
+    if pixels._pre_brightness_buffer is not None:
+        pixels._pre_brightness_buffer[start:end] = data
+    if pixels._brightness == 1.0:
+        pixels._post_brightness_buffer[start:end] = data
+    else:
+        pixels._post_brightness_buffer[start:end] = bytes(data).translate(
+            brightness_lut(pixels._brightness)
+        )
+
+
+def write_frame(pixels, frame, tables: tuple | None = None) -> None:
+    """Write a whole frame to the post-brightness buffer, one pass per channel
+
+    Pixelbuf brightness is held at 1.0 and its pre-brightness buffer dropped,
+    the tables replace its per-pixel scaling.
+
+    Args:
+        pixels (neopixel.NeoPixel | neopixel_emu.NeoPixel): Pixel object, see supports_bulk
+        frame (bytes-like): Frame in the strip's byte order, up to len(pixels) pixels
+        tables (tuple | None, optional): bytes.translate table of every byte of a pixel,
+            see calibration.channel_tables. Defaults to None, copying the frame as is.
+    """
+    # pylint: disable=protected-access
+    pixels._pre_brightness_buffer = None
+    pixels._brightness = 1.0
+
+    post = pixels._post_brightness_buffer
+    start = pixels._offset
+    end = start + min(len(frame), pixels._bytes)
+    if tables is None:
+        post[start:end] = frame[:end - start]
+        return
+    bpp = pixels._bpp
+    for channel, table in enumerate(tables):
+        post[start + channel:end:bpp] = frame[channel:end - start:bpp].translate(table)
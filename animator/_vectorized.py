@@ -0,0 +1,92 @@
+"NumPy whole-frame renderers for animator"
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import light_funcs
+
+AVAILABLE = np is not None
+
+WHEEL = np.array(light_funcs.WHEEL_LUT, dtype=np.uint8) if AVAILABLE else None
+
+
+def _wheel_index(num_pixels: int, step: int):
+    return np.arange(num_pixels) * 256 // num_pixels + step
+
+
+def rainbow(num_pixels: int, step: int):
+    """Render a Rainbow frame
+
+    Args:
+        num_pixels (int): Strip length
+        step (int): Animation step
+
+    Returns:
+        numpy.ndarray: (num_pixels, 3) uint8 RGB frame
+    """
+    return WHEEL[_wheel_index(num_pixels, step) & 255]
+
+
+def glitter(frame, ratio: float):
+    """Sprinkle white pixels over a frame in place
+
+    Args:
+        frame (numpy.ndarray): (N, 3) uint8 RGB frame
+        ratio (float): Fraction of pixels to turn white
+
+    Returns:
+        numpy.ndarray: The same frame
+    """
+    count = int(np.floor(ratio * len(frame)))
+    frame[np.random.randint(0, len(frame), count)] = 255
+    return frame
+
+
+def sine_wheel(num_pixels: int, step: int, low: int, high: int):
+    """Render a Magic or Fire frame, a sine wave over a section of the color wheel
+
+    Args:
+        num_pixels (int): Strip length
+        step (int): Animation step
+        low (int): Lowest wheel position
+        high (int): Highest wheel position
+
+    Returns:
+        numpy.ndarray: (num_pixels, 3) uint8 RGB frame
+    """
+    color = np.sin(_wheel_index(num_pixels, step) / 4 - num_pixels)
+    # same as light_funcs.map_range(color, -1, 1, low, high)
+    color = (color + 1) * (high - low) // 2 + low
+    return WHEEL[color.astype(np.int64) & 255]
+
+
+def to_native(frame_buffer, frame):
+    """Convert an RGB frame to the byte order of a frame buffer
+
+    Args:
+        frame_buffer (FrameBuffer): Frame buffer
+        frame (numpy.ndarray): (N, 3) uint8 RGB frame
+
+    Returns:
+        numpy.ndarray: (N, bpp) uint8 frame
+    """
+    byteorder = frame_buffer.order
+    out = np.zeros((len(frame), frame_buffer.bpp), dtype=np.uint8)
+    if frame_buffer.has_white:  # greys light the white channel, like pixelbuf
+        grey = (frame[:, 0] == frame[:, 1]) & (frame[:, 1] == frame[:, 2])
+        out[:, byteorder[3]] = np.where(grey, frame[:, 0], 0)
+        frame = np.where(grey[:, None], 0, frame)
+    out[:, list(byteorder[:3])] = frame
+    return out
+
+
+def blit(frame_buffer, frame) -> None:
+    """Write an RGB frame to a frame buffer
+
+    Args:
+        frame_buffer (FrameBuffer): Frame buffer
+        frame (numpy.ndarray): (N, 3) uint8 RGB frame
+    """
+    frame_buffer.write_array(0, to_native(frame_buffer, frame))
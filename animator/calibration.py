@@ -0,0 +1,52 @@
+"Gamma, brightness and white balance correction with per-channel lookup tables"
+
+from dataclasses import dataclass
+import functools
+
+IDENTITY = bytes(range(256))  # table that changes nothing
+
+
+@dataclass(frozen=True)
+class Calibration:
+    """Color correction of a strip
+
+    Colors are corrected on the way out, the frame drawn by effects is kept as is.
+    """
+    gamma: float = 1.0  # 1.0 is linear, 2.2 to 2.8 evens out steps at low brightness
+    white_balance: tuple = (1.0, 1.0, 1.0, 1.0)  # scale of the r, g, b and w channels
+
+
+@functools.lru_cache(maxsize=64)
+def channel_lut(gamma: float, scale: float) -> bytes:
+    """Translation table for one channel
+
+    Args:
+        gamma (float): Gamma exponent
+        scale (float): 0 to 1. Brightness times white balance of the channel
+
+    Returns:
+        bytes: 256 entry table for bytes.translate
+    """
+    if gamma == 1.0:  # same truncation as pixelbuf brightness
+        return bytes(int(i * scale) for i in range(256))
+    return bytes(int(255 * (i / 255) ** gamma * scale) for i in range(256))
+
+
+def channel_tables(calibration: Calibration, brightness: float, byteorder: tuple) -> tuple:
+    """Translation tables of every byte of a pixel
+
+    Args:
+        calibration (Calibration): Color correction
+        brightness (float): 0 to 1. Brightness
+        byteorder (tuple): Offsets of the r, g, b and optionally w bytes in a pixel,
+            see adafruit_pixelbuf.PixelBuf.parse_byteorder
+
+    Returns:
+        tuple: One table per byte of a pixel, in the strip's byte order
+    """
+    balance = tuple(calibration.white_balance) + (1.0,) * len(byteorder)
+    tables = [b""] * len(byteorder)
+    for channel, offset in enumerate(byteorder):
+        scale = min(max(brightness * balance[channel], 0.0), 1.0)
+        tables[offset] = channel_lut(calibration.gamma, scale)
+    return tuple(tables)
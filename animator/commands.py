@@ -0,0 +1,67 @@
+"Command queue between the network thread and the render loop"
+
+from collections import OrderedDict
+import logging
+import threading
+from typing import Any, Hashable
+
+
+class CommandQueue:
+    """Bounded, coalescing queue of state changes
+
+    Commands are put from any thread and applied by the render loop between
+    frames, so a frame never sees half of an update. A command replaces any
+    pending command with the same key, only the last brightness, effect or
+    option value sent before a frame is applied.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        """
+        Args:
+            maxsize (int, optional): Pending commands kept, the oldest are dropped past
+                this. Defaults to 256.
+        """
+        self.maxsize = maxsize
+        self.coalesced = 0
+        self.dropped = 0
+        # set while commands are pending
+        self.ready = threading.Event()
+        # called after every put, e.g. to wake an asyncio loop
+        self.on_put = None
+        self._lock = threading.Lock()
+        self._commands: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def put(self, key: Hashable, value: Any = None) -> None:
+        """Queue a command, replacing a pending one with the same key
+
+        Args:
+            key (Hashable): What the command changes
+            value (Any, optional): New value. Defaults to None.
+        """
+        with self._lock:
+            if key in self._commands:
+                self.coalesced += 1
+                del self._commands[key]  # apply in order of the latest update
+            elif len(self._commands) >= self.maxsize:
+                dropped, _ = self._commands.popitem(last=False)
+                self.dropped += 1
+                logging.warning("Command queue full, dropping %s", dropped)
+            self._commands[key] = value
+            self.ready.set()
+        if self.on_put is not None:
+            self.on_put()
+
+    def drain(self) -> list:
+        """Take every pending command
+
+        Returns:
+            list: (key, value) tuples in the order they were last updated
+        """
+        with self._lock:
+            commands = list(self._commands.items())
+            self._commands.clear()
+            self.ready.clear()
+        return commands
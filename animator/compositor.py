@@ -0,0 +1,175 @@
+"Drive several animators over segments of one or more strips"
+
+import time
+
+import adafruit_pixelbuf
+
+from . import _pixelbuf
+from .governor import FrameRateGovernor
+from .metrics import FrameMetrics
+from .pipeline import FramePipeline
+
+
+class PixelView(adafruit_pixelbuf.PixelBuf):
+    """Run of pixels of a parent strip, animated on its own
+
+    The view has its own buffers and brightness. show() copies them into the
+    parent's buffer, the parent is transmitted separately, see Compositor.
+    The parent must be an adafruit_pixelbuf based driver kept at brightness 1.0.
+    """
+
+    def __init__(self, parent, start: int, length: int) -> None:
+        """
+        Args:
+            parent (neopixel.NeoPixel | neopixel_emu.NeoPixel): Strip the view is part of
+            start (int): First pixel of the view on the parent
+            length (int): Number of pixels in the view
+        """
+        if start < 0 or start + length > len(parent):
+            raise ValueError(f"View {start}:{start + length} is outside of a {len(parent)} pixel strip")
+        self.parent = parent
+        self.start = start
+        super().__init__(length, byteorder=parent.byteorder, brightness=1.0, auto_write=False)
+
+    @property
+    def n(self) -> int:
+        """ Get the number of pixels """
+        return len(self)
+
+    def _transmit(self, buffer: bytearray) -> None:
+        _pixelbuf.write_native(self.parent, buffer, self.start)
+
+
+class Compositor:
+    """Runs several animators in one loop
+
+    Every animator renders at its own effect frame rate, into its own strip
+    or a PixelView of one. Each strip that changed is transmitted once per
+    frame, however many segments it holds, unchanged strips are not sent.
+    Segment render times are in the metrics of their animator, metrics holds
+    the time of whole passes over every segment. With pipeline set, strips
+    are transmitted on output threads while the next pass renders, see
+    FramePipeline. With a governor, the frame rate of every segment is capped
+    by the cost of whole passes, see FrameRateGovernor.
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, pipeline: int = 0,
+                 governor: FrameRateGovernor | None = None) -> None:
+        """
+        Args:
+            clock (Callable, optional): Clock of frame deadlines. Defaults to time.monotonic.
+            sleep (Callable, optional): Sleeps between passes. Defaults to time.sleep.
+            pipeline (int, optional): Buffers of every strip transmitted on an output
+                thread, 0 transmits on the render thread. Defaults to 0.
+            governor (FrameRateGovernor, optional): Caps the frame rate of every segment.
+                Defaults to None.
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.pipeline = pipeline
+        self.governor = governor
+        self.segments: list = []
+        self.outputs: list = []
+        self.pipelines: dict = {}  # id of output -> FramePipeline
+        self.metrics = FrameMetrics(clock=clock)
+
+    def add(self, animator, output=None) -> None:
+        """Add an animator
+
+        Args:
+            animator (Animator): Animator drawing on output or on a PixelView of it
+            output (neopixel.NeoPixel | neopixel_emu.NeoPixel, optional): Strip to transmit.
+                Defaults to the parent of animator.pixels, or animator.pixels itself.
+        """
+        if output is None:
+            output = getattr(animator.pixels, "parent", animator.pixels)
+        self.segments.append((animator, output))
+        if self.governor is not None:
+            animator.governor = self.governor
+        if not any(output is known for known in self.outputs):
+            self.outputs.append(output)
+            if self.pipeline and _pixelbuf.supports_bulk(output):
+                self.pipelines[id(output)] = FramePipeline(output, self.pipeline)
+
+        pipeline = self.pipelines.get(id(output))
+        if pipeline is not None:
+            if animator.pixels is output:  # whole strip segment, its show is the transmit
+                pipeline.metrics = animator.metrics
+            else:  # views redraw part of the strip, the rest comes from the last frame
+                pipeline.carry = True
+
+    def render(self) -> list:
+        """Render every segment that is due
+
+        Returns:
+            list: Strips that changed and need to be transmitted
+        """
+        now = self.clock()
+        start = time.perf_counter()
+        changed = []
+        for animator, output in self.segments:
+            deadline = animator.scheduler.deadline
+            if deadline is not None and deadline > now:
+                continue
+            animator.render()
+            animator.scheduler.advance(animator.fps)
+            if not animator.changed:
+                continue
+            if animator.pixels is not output:
+                animator.show()  # copy into the strip
+            if not any(output is known for known in changed):
+                changed.append(output)
+        if changed:
+            self.metrics.render.add(time.perf_counter() - start)
+            self.metrics.frame()
+        return changed
+
+    @property
+    def idle(self) -> bool:
+        """No segment has anything left to draw until its state or args change"""
+        return all(animator.idle for animator, _ in self.segments)
+
+    def reset(self) -> None:
+        """Make every segment due, for example after waiting while idle"""
+        for animator, _ in self.segments:
+            animator.scheduler.reset()
+
+    def next_deadline(self) -> float:
+        """Time the next segment is due, on the compositor clock"""
+        return min(
+            (animator.scheduler.deadline or 0.0) for animator, _ in self.segments
+        )
+
+    def update(self) -> float:
+        """Render due segments and transmit changed strips
+
+        Returns:
+            float: Seconds until the next segment is due
+        """
+        pass_start = time.perf_counter()
+        changed = self.render()
+        if changed:
+            start = time.perf_counter()
+            for output in changed:
+                pipeline = self.pipelines.get(id(output))
+                if pipeline is not None:  # transmit time is added by the output thread
+                    pipeline.submit()
+                    continue
+                output_start = time.perf_counter()
+                output.show()
+                elapsed = time.perf_counter() - output_start
+                for animator, _ in self.segments:
+                    if animator.pixels is output:  # whole strip segment, its show is the transmit
+                        animator.metrics.show.add(elapsed)
+            self.metrics.show.add(time.perf_counter() - start)
+            if self.governor is not None:
+                self.governor.add(time.perf_counter() - pass_start)
+        return self.next_deadline() - self.clock()
+
+    def cycle(self) -> None:
+        """Render due segments, transmit changed strips and wait for the next deadline"""
+        delay = self.update()
+        if delay > 0:
+            start = time.perf_counter()
+            self.sleep(delay)
+            self.metrics.sleep.add(time.perf_counter() - start)
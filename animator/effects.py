@@ -0,0 +1,515 @@
+"Effect registry and built-in effects"
+
+import logging
+import math
+import random
+
+from . import light_funcs
+from . import fixed_funcs
+from . import recording
+from . import stream
+from . import _firework
+
+
+def _numpy_renderers():
+    "animator._vectorized, imported on first use so that NumPy is not loaded at startup"
+    from . import _vectorized  # pylint: disable=import-outside-toplevel
+    return _vectorized
+
+
+COLORS = [
+    (255, 0, 0),  # Red
+    (0, 255, 0),  # Green
+    (255, 255, 0),  # Yellow
+    (0, 0, 255),  # Blue
+    (255, 127, 0),  # Orange
+    (0, 0, 0),  # Off
+]
+
+# Set the desired FPS for your animation
+SLOW_FPS = 5
+BASIC_FPS = 30
+REGULAR_FPS = 45
+FAST_FPS = 60
+UFAST_FPS = 120
+
+MAX_CATCH_UP = 8  # simulation steps of one frame, when frames come late
+
+
+# Animation-specific functions
+def generate_color_pattern(length: int) -> list:
+    """Generate list of colors for ColoredLights animation
+
+    Args:
+        length (int): Length of output
+
+    Returns:
+        list: Output
+    """
+    colors = [
+        (255, 0, 0),  # Red
+        (0, 255, 0),  # Green
+        (255, 255, 0),  # Yellow
+        (0, 0, 255),  # Blue
+        (255, 165, 0),  # Orange
+    ]
+
+    pattern = []
+
+    while len(pattern) < length:
+        pattern.extend(colors)
+
+    return pattern[:length]
+
+
+class Effect:
+    """Base class of animator effects
+
+    The Animator creates an effect when it becomes active, calls setup() once,
+    render() for every frame and teardown() when another effect takes over.
+    State that lives across frames belongs on the effect instance.
+
+    Effects are driven by time, not by frames: before every frame but the
+    first, advance() moves phase on by the time elapsed since the last one at
+    rate steps per second, so an effect looks the same at any frame rate.
+    step is the whole step effects are drawn at, steps the whole steps moved
+    on since the last frame, for effects that simulate one step at a time.
+    """
+    name: str = ""
+    fps: float = BASIC_FPS  # frame rate the effect was designed for
+    rate: float | None = None  # animation steps per second at speed 1, None for fps
+    args_name: str | None = None  # AnimationArgs field holding the effect options
+    cacheable: bool = False  # frames only depend on step and args, see FrameCache
+    static: bool = False  # frames only depend on args, redrawn when they or brightness change
+
+    def __init__(self, animator) -> None:
+        self.animator = animator
+        self.phase = 0.0  # animation steps since setup, with the fraction of the next one
+        self.steps = 1  # whole steps moved on by the last advance
+
+    @property
+    def step(self) -> int:
+        """Animation step, 1 to 255"""
+        return int(self.phase) % 255 + 1
+
+    @property
+    def position(self) -> float:
+        """Animation step with its fraction, 1 to 256"""
+        return self.phase % 255 + 1
+
+    @property
+    def pixels(self):
+        """Pixels to draw on"""
+        return self.animator.pixels
+
+    @property
+    def frame(self):
+        """FrameBuffer to draw on"""
+        return self.animator.frame
+
+    @property
+    def num_pixels(self) -> int:
+        """Strip length"""
+        return self.animator.num_pixels
+
+    @property
+    def args(self):
+        """Effect options from the animator's AnimationArgs"""
+        return getattr(self.animator.animation_args, self.args_name)
+
+    @property
+    def brightness(self) -> float:
+        """Brightness to show the frame at, 0 to 1"""
+        return self.animator.animation_state.brightness / 255.0
+
+    def setup(self) -> None:
+        """Prepare the effect before its first frame"""
+
+    def render(self) -> bool | None:
+        """Draw one frame
+
+        Returns:
+            bool | None: False if the frame was left as it was, it is then not shown again
+        """
+        raise NotImplementedError
+
+    def teardown(self) -> None:
+        """Release anything held by the effect before another one takes over"""
+
+    def advance(self, elapsed: float) -> None:
+        """Move the animation on
+
+        Args:
+            elapsed (float): Seconds since the last frame, scaled by the animator speed
+        """
+        last = int(self.phase)
+        self.phase += elapsed * (self.rate or self.fps)
+        self.steps = int(self.phase) - last
+
+
+EFFECTS: dict[str, type[Effect]] = {}
+
+
+def register_effect(name: str):
+    """Class decorator adding an effect to the registry
+
+    Args:
+        name (str): Effect name used in AnimationState.effect
+
+    Returns:
+        Callable: Decorator
+    """
+    def decorator(cls: type[Effect]) -> type[Effect]:
+        cls.name = name
+        EFFECTS[name] = cls
+        return cls
+    return decorator
+
+
+class Off(Effect):
+    """Strip turned off, also used for unknown effects"""
+    static = True
+
+    @property
+    def brightness(self) -> float:
+        return 0.0
+
+    def render(self) -> None:
+        self.frame.fill((0, 0, 0))
+
+
+@register_effect("SingleColor")
+class SingleColor(Effect):
+    """Fill the strip with one color"""
+    args_name = "single_color"
+    static = True
+
+    def render(self) -> None:
+        self.frame.fill(self.args.color)
+
+
+@register_effect("Rainbow")
+class Rainbow(Effect):
+    """Color wheel scrolling along the strip"""
+    fps = FAST_FPS
+    cacheable = True
+
+    def render(self) -> None:
+        if self.animator.use_numpy:
+            vectorized = _numpy_renderers()
+            vectorized.blit(self.frame, vectorized.rainbow(self.num_pixels, self.step))
+        else:
+            self.frame.write_span(0, (
+                light_funcs.wheel(((i * 256 // self.num_pixels) + self.step) & 255)
+                for i in range(self.num_pixels)
+            ))
+
+
+@register_effect("GlitterRainbow")
+class GlitterRainbow(Effect):
+    """Rainbow with random white sparkles"""
+    fps = FAST_FPS
+    args_name = "glitter_rainbow"
+
+    def render(self) -> None:
+        if self.animator.use_numpy:
+            vectorized = _numpy_renderers()
+            vectorized.blit(
+                self.frame,
+                vectorized.glitter(
+                    vectorized.rainbow(self.num_pixels, self.step),
+                    self.args.glitter_ratio,
+                ),
+            )
+            return
+
+        self.frame.write_span(0, (
+            light_funcs.wheel(((i * 256 // self.num_pixels) + self.step) & 255)
+            for i in range(self.num_pixels)
+        ))
+        for _ in range(math.floor(self.args.glitter_ratio * self.num_pixels)):
+            led = random.randint(0, self.num_pixels - 1)
+            self.frame[led] = (255, 255, 255)
+
+
+@register_effect("Colorloop")
+class Colorloop(Effect):
+    """Whole strip cycling through the color wheel"""
+    fps = FAST_FPS
+
+    def render(self) -> None:
+        self.frame.fill(light_funcs.wheel(self.step))
+
+
+class SineWheel(Effect):
+    """Sine wave over a section of the color wheel"""
+    cacheable = True
+    low: int = 0
+    high: int = 255
+
+    def render(self) -> None:
+        if self.animator.use_numpy:
+            vectorized = _numpy_renderers()
+            vectorized.blit(
+                self.frame,
+                vectorized.sine_wheel(self.num_pixels, self.step, self.low, self.high),
+            )
+        else:
+            palette = light_funcs.sine_palette(self.num_pixels, self.low, self.high)
+            self.frame.write_span(0, (
+                palette[(i * 256 // self.num_pixels) + self.step] for i in range(self.num_pixels)
+            ))
+
+
+@register_effect("Magic")
+class Magic(SineWheel):
+    """Blue and purple waves"""
+    low = 120
+    high = 200
+
+
+@register_effect("Fire")
+class Fire(SineWheel):
+    """Red and orange waves"""
+    fps = REGULAR_FPS
+    low = 70
+    high = 85
+
+
+@register_effect("ColoredLights")
+class ColoredLights(Effect):
+    """Repeating pattern of holiday light colors"""
+    static = True
+
+    def render(self) -> None:
+        pattern = generate_color_pattern(self.num_pixels)
+        self.frame.write_span(0, pattern[1:] + pattern[:1])  # pattern starts on the last pixel
+
+
+@register_effect("Fade")
+class Fade(Effect):
+    """Fade between two colors"""
+    fps = FAST_FPS
+    args_name = "fade"
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.color = bytearray(3)  # reused by the fixed-point path
+
+    def render(self) -> None:
+        if self.animator.fixed_point:
+            colora, colorb = self.args.colora, self.args.colorb
+            channels = min(len(colora), len(colorb))  # as mix_colors zips them
+            if len(self.color) != channels:
+                self.color = bytearray(channels)
+            # the fraction of the position keeps the fade smooth at low frame rates
+            fixed_funcs.mix_into(self.color, 0, colora, colorb,
+                                 fixed_funcs.half_sine(int(self.position * fixed_funcs.ONE)))
+            self.frame.fill(self.color)
+            return
+
+        self.frame.fill(
+            light_funcs.round_tuple(
+                light_funcs.mix_colors(
+                    self.args.colora,
+                    self.args.colorb,
+                    # the half wave ends at 255, positions past it would mix beyond colora
+                    max(math.sin((self.position / 255) * math.pi), 0.0),
+                )
+            )
+        )
+
+
+@register_effect("Flash")
+class Flash(Effect):
+    """Flash between two colors"""
+    args_name = "flash"
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.wave = 0.0  # fraction of the flash period
+
+    def setup(self) -> None:
+        # fraction of the flash period, kept when the period changes so the flash does not skip
+        self.wave = self.step / self.args.speed % 1.0 if self.args.speed > 0 else 0.0
+
+    def render(self) -> None:
+        if self.wave < 0.5:
+            self.frame.fill(self.args.colora)
+        else:
+            self.frame.fill(self.args.colorb)
+
+    def advance(self, elapsed: float) -> None:
+        last = self.phase
+        super().advance(elapsed)
+        if self.args.speed > 0:  # speed is the period, in steps
+            self.wave = (self.wave + (self.phase - last) / self.args.speed) % 1.0
+
+
+@register_effect("Wipe")
+class Wipe(Effect):
+    """Wipe two colors along the strip in turns"""
+    fps = FAST_FPS
+    args_name = "wipe"
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.swipe_stage = 0
+        self.wipe_position = 0
+
+    def render(self) -> None:
+        # leds_iter pixels per animation step, a long stall catches up MAX_CATCH_UP steps at most
+        for _ in range(self.args.leds_iter * min(self.steps, MAX_CATCH_UP)):
+            if self.wipe_position >= self.num_pixels:  # strip filled, wipe the other color
+                self.swipe_stage = 1 - self.swipe_stage
+                self.wipe_position = 0
+            else:
+                self.frame[self.wipe_position] = (
+                    self.args.colora if self.swipe_stage == 0 else self.args.colorb
+                )
+                self.wipe_position += 1
+
+
+@register_effect("Firework")
+class Firework(Effect):
+    """1D fireworks"""
+    fps = UFAST_FPS
+    args_name = "firework"
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.engine: _firework.FireworkEngine | None = None
+
+    def setup(self) -> None:
+        self.engine = _firework.FireworkEngine(self.args)
+
+    def render(self) -> bool | None:
+        # one simulation step per animation step, the frame is held while there is none
+        if not self.steps:
+            return False
+        for _ in range(min(self.steps, MAX_CATCH_UP)):
+            self.engine.step(self.args, self.frame)
+
+
+@register_effect("Playback")
+class Playback(Effect):
+    """Frames of a recording, see animator.recording"""
+    args_name = "playback"
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.recording: recording.Recording | None = None
+        self.path: str | None = None
+        self.index = 0
+
+    def _open(self) -> None:
+        """Open the recording in args, keeps None if it can not be played here"""
+        self.teardown()
+        self.path = self.args.path
+        self.index = 0
+        if not self.path:  # no recording chosen yet, the strip stays black
+            return
+        try:
+            rec = recording.Recording(self.path)
+        except (OSError, ValueError) as e:
+            logging.error("Can not play %s: %s", self.path, e)
+            return
+        if rec.byteorder != self.frame.byteorder:
+            logging.error("Can not play %s, recorded for %s pixels", self.path, rec.byteorder)
+            rec.close()
+            return
+        self.recording = rec
+        self.fps = rec.fps
+
+    def render(self) -> None:
+        if self.args.path != self.path:  # changed over MQTT
+            self._open()
+        if self.recording is None or not self.recording.frame_count:
+            self.frame.fill((0, 0, 0))
+            return
+
+        if self.index >= self.recording.frame_count:
+            if not self.args.loop:
+                return  # hold the last frame
+            self.index %= self.recording.frame_count
+        frame = self.recording.frame(self.index)
+        self.frame.write_array(0, frame[:self.num_pixels * self.recording.bpp])
+
+    def advance(self, elapsed: float) -> None:
+        super().advance(elapsed)
+        self.index += self.steps  # recorded frames are steps at the recording's frame rate
+
+    def teardown(self) -> None:
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+
+
+@register_effect("Random")
+class Random(Effect):
+    """Random pixels on and off"""
+    fps = SLOW_FPS
+    args_name = "random"
+
+    def render(self) -> bool | None:
+        if not self.steps:
+            return False  # new pixels every step, not every frame
+        color = self.args.color
+        self.frame.write_span(0, [
+            color if random.randint(0, 1) == 1 else (0, 0, 0) for _ in range(self.num_pixels)
+        ])
+
+
+@register_effect("RandomColor")
+class RandomColor(Effect):
+    """Random colors on every pixel"""
+    fps = SLOW_FPS
+
+    def render(self) -> bool | None:
+        if not self.steps:
+            return False  # new pixels every step, not every frame
+        self.frame.write_span(0, [COLORS[random.randint(0, 5)] for _ in range(self.num_pixels)])
+
+
+@register_effect("Stream")
+class Stream(Effect):
+    """Frames rendered on another host, received from the stream topic, see animator.stream
+
+    Packets are written into the frame as they arrive, between frames, the
+    last frame is held until the next one.
+    """
+    static = True
+
+    def __init__(self, animator) -> None:
+        super().__init__(animator)
+        self.sequence: int | None = None
+        self.received = 0
+        self.dropped = 0  # stale or not fitting the strip
+
+    def render(self) -> None:
+        pass  # the frame is written by receive()
+
+    def receive(self, sequence: int | None, start: int, data) -> bool:
+        """Write a packet into the frame, see animator.stream.unpack
+
+        Args:
+            sequence (int | None): Sequence number, None for packets without a header
+            start (int): First pixel
+            data (bytes-like): Pixels packed in r, g, b(, w) order
+
+        Returns:
+            bool: The packet was written, stale and invalid packets are dropped
+        """
+        if sequence is not None and stream.is_stale(sequence, self.sequence):
+            self.dropped += 1
+            return False
+        try:
+            self.frame.write_rgb(start, data)
+        except (ValueError, IndexError) as err:
+            self.dropped += 1
+            logging.debug("Dropping stream packet: %s", err)
+            return False
+        self.sequence = sequence
+        self.received += 1
+        self.animator.invalidate()
+        return True
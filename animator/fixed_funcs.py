@@ -0,0 +1,59 @@
+"""Fixed-point counterparts of light_funcs, for boards without a fast FPU
+
+Weights are 8.8 fixed point ints, ONE is 1.0. Results are written into a
+buffer given by the caller, no floats or tuples are created per call.
+Results can be one lower than the float helpers, which truncate differently.
+"""
+
+import math
+
+ONE = 256  # 1.0 in 8.8 fixed point
+
+
+def to_fixed(x: float) -> int:
+    """Convert to 8.8 fixed point
+
+    Args:
+        x (float): Value
+
+    Returns:
+        int: x * ONE, rounded
+    """
+    return round(x * ONE)
+
+
+# sin(step / 255 * pi) for every step 0 to 256, the half wave Fade runs on, 0 past its end
+HALF_SINE = tuple(max(to_fixed(math.sin(step / 255 * math.pi)), 0) for step in range(257))
+
+
+def half_sine(position: int) -> int:
+    """Half wave between two steps of HALF_SINE
+
+    Args:
+        position (int): 0 to 256 * ONE. Animation position in 8.8 fixed point
+
+    Returns:
+        int: 0 to ONE. sin(position / 255 * pi), linearly interpolated
+    """
+    index = position >> 8
+    low = HALF_SINE[index]
+    if index == 256:
+        return low
+    return low + ((HALF_SINE[index + 1] - low) * (position & 255) >> 8)
+
+
+def mix_into(out, offset: int, color1, color2, weight: int) -> None:
+    """Mix two colors, like light_funcs.mix_colors and light_funcs.color_fade
+
+    Args:
+        out (bytearray): Buffer the color is written to, one byte per channel
+        offset (int): Index of the first channel in out
+        color1 (tuple | list): Color at weight 0
+        color2 (tuple | list): Color at weight ONE, channels past the end of the
+            shorter color are left out like zip() does
+        weight (int): 0 to ONE. Position between the colors
+    """
+    inverse = ONE - weight
+    for value1, value2 in zip(color1, color2):
+        out[offset] = (value1 * inverse + value2 * weight) >> 8
+        offset += 1
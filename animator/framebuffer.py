@@ -0,0 +1,152 @@
+"Frame buffer effects draw into"
+
+import adafruit_pixelbuf
+
+
+class FrameBuffer:
+    """Frame of a strip in its native byte order, before brightness
+
+    Effects draw into the frame with bulk writes, the Animator hands it to the
+    driver once per frame. Colors are (r, g, b), (r, g, b, w) tuples, lists or
+    bytearrays, or 0xRRGGBB ints, encoded like adafruit_pixelbuf does: on RGBW strips greys
+    given as RGB light the white LED only.
+    """
+
+    def __init__(self, num_pixels: int, byteorder: str = "RGB") -> None:
+        """
+        Args:
+            num_pixels (int): Strip length
+            byteorder (str, optional): Pixel order, as for adafruit_pixelbuf. Defaults to "RGB".
+        """
+        self.num_pixels = num_pixels
+        self.byteorder = byteorder
+        self.bpp, self.order, self.has_white, _ = adafruit_pixelbuf.PixelBuf.parse_byteorder(
+            byteorder
+        )
+        self.buffer = bytearray(num_pixels * self.bpp)
+        self._encoded: dict = {}
+
+    def __len__(self) -> int:
+        return self.num_pixels
+
+    def encode(self, color) -> bytes:
+        """Encode a color
+
+        Args:
+            color (tuple | list | bytearray | int): Color
+
+        Returns:
+            bytes: bpp bytes in the frame's byte order
+        """
+        if isinstance(color, list):
+            key = tuple(color)
+        elif isinstance(color, bytearray):  # reused by the caller, keyed by its value
+            key = bytes(color)
+        else:
+            key = color
+        encoded = self._encoded.get(key)
+        if encoded is not None:
+            return encoded
+
+        w = 0
+        if isinstance(color, int):
+            r, g, b = color >> 16 & 255, color >> 8 & 255, color & 255
+        elif len(color) == 4:
+            r, g, b, w = color
+        else:
+            r, g, b = color
+        if self.has_white and (isinstance(color, int) or len(color) == 3) and r == g == b:
+            r, g, b, w = 0, 0, 0, r
+
+        pixel = bytearray(self.bpp)
+        for offset, value in zip(self.order, (r, g, b, w)):
+            pixel[offset] = int(value)
+        encoded = bytes(pixel)
+        if len(self._encoded) >= 4096:  # bound memory of effects with many colors
+            self._encoded.clear()
+        self._encoded[key] = encoded
+        return encoded
+
+    def fill(self, color) -> None:
+        """Set every pixel to one color
+
+        Args:
+            color (tuple | list | bytearray | int): Color
+        """
+        self.buffer[:] = self.encode(color) * self.num_pixels
+
+    def fill_range(self, start: int, stop: int, color) -> None:
+        """Set a run of pixels to one color
+
+        Args:
+            start (int): First pixel
+            stop (int): Pixel after the last one
+            color (tuple | list | bytearray | int): Color
+        """
+        start, stop, _ = slice(start, stop).indices(self.num_pixels)
+        if stop > start:
+            self.buffer[start * self.bpp:stop * self.bpp] = self.encode(color) * (stop - start)
+
+    def write_span(self, start: int, colors) -> None:
+        """Set consecutive pixels
+
+        Args:
+            start (int): First pixel
+            colors (Iterable): Colors of the pixels from start on
+        """
+        encode = self.encode
+        data = b"".join([encode(color) for color in colors])
+        self.write_array(start, data)
+
+    def write_array(self, start: int, data) -> None:
+        """Copy pixels already in the frame's byte order
+
+        Args:
+            start (int): First pixel
+            data (bytes-like): Whole pixels, C-contiguous, for example a uint8 NumPy array
+        """
+        data = memoryview(data).cast("B")
+        offset = start * self.bpp
+        if offset < 0 or offset + len(data) > len(self.buffer):
+            raise IndexError(f"{len(data) // self.bpp} pixels at {start} are outside of the frame")
+        self.buffer[offset:offset + len(data)] = data
+
+    def write_rgb(self, start: int, data) -> None:
+        """Copy pixels packed in r, g, b(, w) order, reordered to the frame's byte order
+
+        Args:
+            start (int): First pixel
+            data (bytes-like): Whole pixels, bpp bytes each
+
+        Raises:
+            ValueError: data is not made of whole pixels
+            IndexError: The pixels do not fit in the frame
+        """
+        data = memoryview(data).cast("B")
+        if len(data) % self.bpp:
+            raise ValueError(f"{len(data)} bytes are not whole {self.bpp} byte pixels")
+        if self.order == tuple(range(self.bpp)):
+            self.write_array(start, data)
+            return
+        offset = start * self.bpp
+        end = offset + len(data)
+        if offset < 0 or end > len(self.buffer):
+            raise IndexError(f"{len(data) // self.bpp} pixels at {start} are outside of the frame")
+        for channel, index in enumerate(self.order):  # one strided copy per channel
+            self.buffer[offset + index:end:self.bpp] = data[channel::self.bpp]
+
+    def __setitem__(self, index: int, color) -> None:
+        if index < 0:
+            index += self.num_pixels
+        if not 0 <= index < self.num_pixels:
+            raise IndexError
+        offset = index * self.bpp
+        self.buffer[offset:offset + self.bpp] = self.encode(color)
+
+    def __getitem__(self, index: int) -> tuple:
+        if index < 0:
+            index += self.num_pixels
+        if not 0 <= index < self.num_pixels:
+            raise IndexError
+        offset = index * self.bpp
+        return tuple(self.buffer[offset + channel] for channel in self.order)
@@ -0,0 +1,89 @@
+"Frame cache for periodic animations"
+
+from collections import OrderedDict
+from typing import Hashable
+
+
+def freeze(value):
+    """Turn effect arguments into something hashable
+
+    Args:
+        value (any): Arguments, usually from dataclasses.astuple. JSON updates store lists
+
+    Returns:
+        any: The value with every list converted to a tuple
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class FrameCache:
+    """LRU cache of rendered frames, bounded by memory
+
+    Keys are (effect, num_pixels, step, args) tuples, values are raw frames in
+    the strip's byte order.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        Args:
+            max_size (int): Memory bound in bytes, 0 disables the cache
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, key: Hashable) -> bytes | None:
+        """Get a cached frame
+
+        Args:
+            key (Hashable): Frame key
+
+        Returns:
+            bytes | None: Frame, None if it is not cached
+        """
+        frame = self._frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key: Hashable, frame: bytes) -> None:
+        """Cache a frame, evicting the least recently used ones to stay in bounds
+
+        Args:
+            key (Hashable): Frame key
+            frame (bytes): Frame
+        """
+        if len(frame) > self.max_size:
+            return
+        old = self._frames.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        while self.size + len(frame) > self.max_size:
+            _, evicted = self._frames.popitem(last=False)
+            self.size -= len(evicted)
+        self._frames[key] = frame
+        self.size += len(frame)
+
+    def invalidate(self, effect: str) -> None:
+        """Drop every cached frame of an effect
+
+        Args:
+            effect (str): Effect name
+        """
+        for key in [key for key in self._frames if key[0] == effect]:
+            self.size -= len(self._frames.pop(key))
+
+    def clear(self) -> None:
+        """Drop every cached frame"""
+        self._frames.clear()
+        self.size = 0
@@ -0,0 +1,130 @@
+"Adaptive frame rate under CPU pressure"
+
+import logging
+import time
+
+
+class FrameRateGovernor:
+    """Caps the frame rate of a render loop to what the CPU keeps up with
+
+    The loop reports how long every frame kept it busy rendering and
+    transmitting. Every interval the busy share of the wall time is compared
+    to the share left once reserve is kept for the network thread: above it
+    the frame rate is capped in proportion, well under it the cap is raised
+    again. Effects move on with time, so a lower frame rate looks the same,
+    only less smooth.
+    """
+    HEADROOM = 0.6  # raise the cap once the load is under this share of the target
+    RAISE = 1.25  # cap multiplier when raising it
+
+    def __init__(
+        self,
+        min_fps: float = 10.0,
+        max_fps: float = 120.0,
+        reserve: float = 0.25,
+        interval: float = 1.0,
+        clock=time.monotonic,
+    ) -> None:
+        """
+        Args:
+            min_fps (float, optional): Lowest frame rate it caps to, effects designed for
+                less keep their own. Defaults to 10.0.
+            max_fps (float, optional): Highest frame rate, also for effects asking for
+                more. Defaults to 120.0.
+            reserve (float, optional): 0 to 1. Share of the CPU time kept free for the
+                network thread. Defaults to 0.25.
+            interval (float, optional): Seconds between decisions. Defaults to 1.0.
+            clock (Callable, optional): Clock. Defaults to time.monotonic.
+        """
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.reserve = reserve
+        self.interval = interval
+        self.clock = clock
+
+        self.cap: float | None = None  # None while the loop keeps up
+        self.load = 0.0  # busy share of the last interval
+        self.decisions = 0  # times the cap changed
+        # cap, load and reason of the last decision
+        self.decision: dict = {"cap": None, "load": 0.0, "reason": "start"}
+
+        self._busy = 0.0
+        self._frames = 0
+        self._window_start: float | None = None
+
+    def limit(self, fps: float) -> float:
+        """Frame rate to run at
+
+        Args:
+            fps (float): Frame rate asked for
+
+        Returns:
+            float: fps within the cap and max_fps, never more than fps
+        """
+        if self.cap is not None:  # min_fps bounds the cap, not the effect's own rate
+            fps = min(fps, max(self.cap, self.min_fps))
+        return min(fps, self.max_fps)
+
+    def add(self, busy: float) -> bool:
+        """Count a frame and decide if an interval is over
+
+        Args:
+            busy (float): Seconds the frame took to render and transmit
+
+        Returns:
+            bool: The cap changed
+        """
+        now = self.clock()
+        if self._window_start is None:  # from the start of the first frame
+            self._window_start = now - busy
+        self._busy += busy
+        self._frames += 1
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return False
+
+        self.load = self._busy / elapsed
+        fps = self._frames / elapsed
+        self._busy = 0.0
+        self._frames = 0
+        self._window_start = now
+        return self._decide(fps)
+
+    def _decide(self, fps: float) -> bool:
+        target = 1.0 - self.reserve
+        if self.load > target:  # falling behind, or starving the network thread
+            cap = max(fps * target / self.load, self.min_fps)
+            if self.cap is not None and cap >= self.cap:
+                return False
+            self.cap = cap
+            reason = "overload"
+        elif self.cap is not None and self.load < target * self.HEADROOM:
+            cap = self.cap * self.RAISE
+            self.cap = None if cap >= self.max_fps else cap
+            reason = "headroom"
+        else:
+            return False
+        self.decisions += 1
+        self.decision = {
+            "cap": None if self.cap is None else round(self.cap, 2),
+            "load": round(self.load, 3),
+            "reason": reason,
+        }
+        logging.info("Frame rate %s at %.0f%% load (%s)",
+                     "uncapped" if self.cap is None else f"capped to {self.cap:.1f} fps",
+                     self.load * 100, reason)
+        return True
+
+    def snapshot(self) -> dict:
+        """Current state
+
+        Returns:
+            dict: JSON serializable cap, load of the last interval, reason of the
+                last decision and number of decisions
+        """
+        return {
+            "cap": self.decision["cap"],
+            "load": round(self.load, 3),
+            "reason": self.decision["reason"],
+            "decisions": self.decisions,
+        }
@@ -1,4 +1,6 @@
 from typing import Any
+import functools
+import math
 
 "Useful functions for animator"
 
@@ -65,15 +67,7 @@ def map_range(x: float, in_min: int, in_max: int, out_min: int, out_max: int):
     return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
 
-def wheel(pos: float) -> tuple:
-    """Get color form color wheel
-
-    Args:
-        pos (float): 0 to 255. Position on wheel
-
-    Returns:
-        tuple: Output RGB color
-    """
+def _wheel(pos: float) -> tuple:
     if pos < 0 or pos > 255:
         r = g = b = 0
     elif pos < 85:
@@ -93,6 +87,42 @@ def wheel(pos: float) -> tuple:
     return (r, g, b)
 
 
+# Color wheel for every integer position
+WHEEL_LUT = tuple(_wheel(pos) for pos in range(256))
+
+
+def wheel(pos: float) -> tuple:
+    """Get color form color wheel
+
+    Args:
+        pos (float): 0 to 255. Position on wheel
+
+    Returns:
+        tuple: Output RGB color
+    """
+    if isinstance(pos, int) and 0 <= pos <= 255:
+        return WHEEL_LUT[pos]
+    return _wheel(pos)
+
+
+@functools.lru_cache(maxsize=16)
+def sine_palette(num_pixels: int, low: int, high: int) -> tuple:
+    """Colors of a sine wave over a section of the color wheel (Magic and Fire)
+
+    Args:
+        num_pixels (int): Strip length
+        low (int): Lowest wheel position
+        high (int): Highest wheel position
+
+    Returns:
+        tuple: Output RGB color for every pixel index (i * 256 // num_pixels + step)
+    """
+    return tuple(
+        WHEEL_LUT[int(map_range(math.sin(index / 4 - num_pixels), -1, 1, low, high)) & 255]
+        for index in range(512)
+    )
+
+
 def square_wave(t, period, amplitude):
     """Generate square wave
 
@@ -0,0 +1,218 @@
+"Frame timing instrumentation"
+
+from bisect import bisect_left
+from collections import deque
+import threading
+import time
+
+# bucket upper bounds in seconds, 1 us to about 1 s in steps of 2 ** 0.25
+BOUNDS = tuple(1e-6 * 2 ** (i / 4) for i in range(81))
+
+
+class RollingHistogram:
+    """Distribution of the last window samples, in fixed log-spaced buckets
+
+    Adding a sample is a bisect and a few integer updates, quantiles are read
+    from the bucket counts and accurate to a bucket, about 19%.
+    """
+
+    def __init__(self, window: int = 1024) -> None:
+        """
+        Args:
+            window (int, optional): Number of most recent samples described. Defaults to 1024.
+        """
+        self.window = window
+        self.counts = [0] * (len(BOUNDS) + 1)  # last bucket holds samples over BOUNDS[-1]
+        self._ring = bytearray(window)  # bucket of every sample in the window
+        self._position = 0
+        self._filled = 0
+        self.count = 0  # samples ever added
+        self.sum = 0.0  # of samples ever added
+
+    def add(self, value: float) -> None:
+        """Add a sample
+
+        Args:
+            value (float): Duration in seconds
+        """
+        bucket = bisect_left(BOUNDS, value)
+        if self._filled == self.window:
+            self.counts[self._ring[self._position]] -= 1
+        else:
+            self._filled += 1
+        self._ring[self._position] = bucket
+        self.counts[bucket] += 1
+        self._position = (self._position + 1) % self.window
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile of the window
+
+        Args:
+            q (float): 0 to 1. Quantile, 0.5 is the median
+
+        Returns:
+            float: Upper bound of the bucket holding the quantile, 0.0 without samples
+        """
+        if not self._filled:
+            return 0.0
+        rank = max(q * self._filled, 1)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BOUNDS[min(bucket, len(BOUNDS) - 1)]
+        return BOUNDS[-1]
+
+    def summary(self) -> dict:
+        """Quantiles of the window in microseconds
+
+        Returns:
+            dict: p50, p90, p99 and max
+        """
+        return {
+            name: round(self.quantile(q) * 1e6, 1)
+            for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        }
+
+    def reset(self) -> None:
+        """Forget the window, totals are kept"""
+        self.counts = [0] * len(self.counts)
+        self._position = 0
+        self._filled = 0
+
+
+class FrameMetrics:
+    """Render, show and sleep times and achieved frame rate of an animation loop"""
+
+    def __init__(self, window: int = 1024, clock=time.monotonic) -> None:
+        """
+        Args:
+            window (int, optional): Frames described by the histograms. Defaults to 1024.
+            clock (Callable, optional): Clock of frame times. Defaults to time.monotonic.
+        """
+        self.clock = clock
+        self.render = RollingHistogram(window)
+        self.show = RollingHistogram(window)
+        self.sleep = RollingHistogram(window)
+        self.frames = 0
+        self._frame_times: deque = deque(maxlen=window)
+
+    def frame(self) -> None:
+        """Count a rendered frame"""
+        self.frames += 1
+        self._frame_times.append(self.clock())
+
+    def fps(self, span: float = 5.0) -> float:
+        """Achieved frame rate
+
+        Args:
+            span (float, optional): Seconds to average over. Defaults to 5.0.
+
+        Returns:
+            float: Frames per second over the last span seconds
+        """
+        if not self._frame_times:
+            return 0.0
+        now = self.clock()
+        span = min(span, now - self._frame_times[0]) or span
+        since = now - span
+        return sum(1 for t in reversed(self._frame_times) if t >= since) / span
+
+    def reset(self) -> None:
+        """Forget the windows, for example when the effect changes"""
+        self.render.reset()
+        self.show.reset()
+        self.sleep.reset()
+        self._frame_times.clear()
+
+    def snapshot(self) -> dict:
+        """Current metrics
+
+        Returns:
+            dict: JSON serializable metrics, times in microseconds, histograms
+                without samples are left out
+        """
+        snapshot: dict = {"fps": round(self.fps(), 2), "frames": self.frames}
+        for name in ("render", "show", "sleep"):
+            histogram = getattr(self, name)
+            if histogram.count:
+                snapshot[name + "_us"] = histogram.summary()
+        return snapshot
+
+
+def _escape(label) -> str:
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(samples: list) -> str:
+    """Format metrics in the Prometheus text exposition format
+
+    Args:
+        samples (list): (name, labels dict, value) tuples, names of the same metric together
+
+    Returns:
+        str: Exposition text
+    """
+    lines = []
+    for name, labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def histogram_samples(name: str, labels: dict, histogram: RollingHistogram) -> list:
+    """Prometheus summary samples of a histogram
+
+    Args:
+        name (str): Metric name, in seconds
+        labels (dict): Labels of every sample
+        histogram (RollingHistogram): Histogram
+
+    Returns:
+        list: (name, labels dict, value) tuples, see prometheus_text
+    """
+    samples = [
+        (name, {**labels, "quantile": str(q)}, histogram.quantile(q)) for q in (0.5, 0.9, 0.99)
+    ]
+    samples.append((name + "_sum", labels, histogram.sum))
+    samples.append((name + "_count", labels, histogram.count))
+    return samples
+
+
+def serve_prometheus(port: int, collect, host: str = "") -> "ThreadingHTTPServer":
+    """Serve metrics over HTTP on a daemon thread
+
+    Args:
+        port (int): TCP port
+        collect (Callable): Returns the samples to serve, see prometheus_text
+        host (str, optional): Address to listen on. Defaults to every address.
+
+    Returns:
+        ThreadingHTTPServer: Running server
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # only when serving
+
+    class Handler(BaseHTTPRequestHandler):
+        "Serves /metrics"
+        def do_GET(self):  # pylint: disable=invalid-name
+            "Handle a scrape"
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = prometheus_text(collect()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,98 @@
+"Double or triple buffered transmission of frames on an output thread"
+
+import logging
+import queue
+import threading
+import time
+
+from .metrics import RollingHistogram
+
+
+class FramePipeline:
+    """Transmits frames of a strip on an output thread while the next ones render
+
+    The strip gets depth preallocated post-brightness buffers. submit() hands
+    the buffer just rendered to the output thread and installs a free one in
+    its place, so frame N + 1 renders while frame N is on the wire and no frame
+    is copied between the stages. Rendering blocks when every buffer is queued
+    or being transmitted, so a transmit-bound strip runs at the transmit rate
+    and frames keep being paced by the render side's frame deadlines.
+
+    Frames are transmitted with the driver's _transmit(buffer), the driver must
+    send the buffer it is given. Strips that are only partly redrawn every
+    frame, the parents of PixelViews, need carry so that the new buffer starts
+    from the last frame, which costs one copy per frame.
+    """
+
+    def __init__(self, pixels, depth: int = 2, carry: bool = False, metrics=None) -> None:
+        """
+        Args:
+            pixels (neopixel.NeoPixel | neopixel_net.E131 | neopixel_net.DDP): Strip,
+                see _pixelbuf.supports_bulk
+            depth (int, optional): 2 or more. Number of buffers. Defaults to 2.
+            carry (bool, optional): Start every frame from a copy of the last one.
+                Defaults to False.
+            metrics (FrameMetrics, optional): Transmit times are added to its show
+                histogram. Defaults to None.
+        """
+        if depth < 2:
+            raise ValueError(f"A pipeline needs at least 2 buffers, got {depth}")
+        self.pixels = pixels
+        self.depth = depth
+        self.carry = carry
+        self.metrics = metrics
+        self.transmit_times = RollingHistogram()
+        self.stalls = 0  # submits that waited for the output thread
+
+        # pylint: disable=protected-access
+        current = pixels._post_brightness_buffer
+        self._free: queue.SimpleQueue = queue.SimpleQueue()
+        for _ in range(depth - 1):
+            self._free.put(bytearray(current))  # same header and trailer bytes
+        self._ready: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._output_loop, name="FramePipeline",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self) -> None:
+        """Queue the frame in the strip's buffer for transmission and swap in a free buffer"""
+        # pylint: disable=protected-access
+        rendered = self.pixels._post_brightness_buffer
+        self._ready.put(rendered)
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            buffer = self._free.get()
+        if self.carry:
+            buffer[:] = rendered
+        self.pixels._post_brightness_buffer = buffer
+
+    def flush(self) -> None:
+        """Wait until every submitted frame is transmitted"""
+        self._ready.join()
+
+    def close(self) -> None:
+        """Transmit the submitted frames and stop the output thread"""
+        if not self._thread.is_alive():
+            return
+        self._ready.put(None)
+        self._thread.join()
+
+    def _output_loop(self) -> None:
+        while True:
+            buffer = self._ready.get()
+            if buffer is None:
+                self._ready.task_done()
+                return
+            start = time.perf_counter()
+            try:
+                self.pixels._transmit(buffer)  # pylint: disable=protected-access
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Transmitting a frame failed")
+            elapsed = time.perf_counter() - start
+            self.transmit_times.add(elapsed)
+            if self.metrics is not None:
+                self.metrics.show.add(elapsed)
+            self._free.put(buffer)
+            self._ready.task_done()
@@ -0,0 +1,155 @@
+"""Pre-rendered animations
+
+A recording is a header followed by raw frames in the strip's byte order,
+before brightness is applied:
+
+    magic "NPXR", version (uint16), bytes per pixel (uint8), pad byte,
+    pixel order (4 bytes, NUL padded), fps (float32),
+    pixel count (uint32), frame count (uint32), all little endian
+
+Recordings are played back from a memory map by the Playback effect, frames
+are copied straight into the frame buffer and only the pages being played
+are kept in memory. Use record_effect.py to record an effect.
+"""
+
+from dataclasses import dataclass
+import mmap
+import struct
+
+MAGIC = b"NPXR"
+VERSION = 1
+HEADER = struct.Struct("<4sHBx4sfII")
+
+
+@dataclass
+class PlaybackArgs:
+    """Playback Animation options"""
+    path: str = ""  # recording to play
+    loop: bool = True  # start over at the end, or hold the last frame
+
+
+class Recorder:
+    """Writes frames to a recording file"""
+
+    def __init__(
+        self, path: str, num_pixels: int, bpp: int, fps: float, byteorder: str = "RGB"
+    ) -> None:
+        """
+        Args:
+            path (str): File to write
+            num_pixels (int): Pixels in a frame
+            bpp (int): Bytes per pixel
+            fps (float): Playback frame rate
+            byteorder (str, optional): Pixel order of the frames. Defaults to "RGB".
+        """
+        self.num_pixels = num_pixels
+        self.bpp = bpp
+        self.fps = fps
+        self.byteorder = byteorder
+        self.frame_size = num_pixels * bpp
+        self.frame_count = 0
+        self._file = open(path, "wb")  # pylint: disable=consider-using-with
+        self._write_header()
+
+    def _write_header(self) -> None:
+        self._file.write(HEADER.pack(
+            MAGIC, VERSION, self.bpp, self.byteorder.encode("ascii"),
+            self.fps, self.num_pixels, self.frame_count,
+        ))
+
+    def write(self, frame) -> None:
+        """Append a frame
+
+        Args:
+            frame (bytes-like): num_pixels * bpp bytes in the recording's byte order
+        """
+        if len(frame) != self.frame_size:
+            raise ValueError(f"Frame is {len(frame)} bytes, expected {self.frame_size}")
+        self._file.write(frame)
+        self.frame_count += 1
+
+    def close(self) -> None:
+        """Write the frame count and close the file"""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._write_header()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class Recording:
+    """Memory-mapped recording file"""
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): Recording file
+
+        Raises:
+            ValueError: The file is not a recording
+        """
+        with open(path, "rb") as file:
+            if file.seek(0, 2) < HEADER.size:
+                raise ValueError(f"{path} is not a recording")
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.bpp, byteorder, self.fps, self.num_pixels, frame_count = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} recording")
+        self.byteorder = byteorder.rstrip(b"\0").decode("ascii")
+        self.frame_size = self.num_pixels * self.bpp
+
+        # a recorder that did not finish leaves a frame count of 0, play what is there
+        available = (len(self._map) - HEADER.size) // self.frame_size if self.frame_size else 0
+        self.frame_count = min(frame_count, available) if frame_count else available
+        self._view = memoryview(self._map)
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def frame(self, index: int) -> memoryview:
+        """Get a frame without copying it
+
+        Args:
+            index (int): Frame number
+
+        Returns:
+            memoryview: frame_size bytes in the recording's byte order
+        """
+        start = HEADER.size + index * self.frame_size
+        return self._view[start:start + self.frame_size]
+
+    def close(self) -> None:
+        """Unmap the file, frames returned by frame() must not be used anymore"""
+        self._view.release()
+        self._map.close()
+
+
+def record(animator, path: str, frames: int) -> int:
+    """Record frames of the animator's current effect, without pacing or showing them
+
+    Args:
+        animator (Animator): Animator
+        path (str): File to write
+        frames (int): Number of frames to record
+
+    Returns:
+        int: Number of frames recorded
+    """
+    frame = animator.frame
+    animator.realtime = False  # frames are 1 / fps apart however long they take to render
+    animator.render()  # the effect and its frame rate are known after the first frame
+    with Recorder(path, animator.num_pixels, frame.bpp, animator.fps, frame.byteorder) as recorder:
+        recorder.write(frame.buffer)
+        for _ in range(frames - 1):
+            animator.render()
+            recorder.write(frame.buffer)
+        return recorder.frame_count
@@ -0,0 +1,70 @@
+"Frame pacing for animator"
+
+import time
+
+
+class FrameScheduler:
+    """Paces frames against absolute monotonic deadlines
+
+    Instead of sleeping a fixed ``1 / fps`` after every frame, the scheduler
+    keeps a running deadline and only sleeps for what is left of the frame
+    budget once render and transmit time are taken off. Frames that finish
+    late skip the sleep so the following frames catch up. If the loop falls
+    ``max_lag`` or more frames behind, the missed deadlines are dropped so the
+    backlog is not rendered back to back.
+    """
+
+    def __init__(self, max_lag: int = 2, clock=time.monotonic, sleep=time.sleep) -> None:
+        self.max_lag = max_lag
+        self.clock = clock
+        self.sleep = sleep
+
+        self.fps = 0.0
+        self.deadline = None
+        self.frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+
+    def reset(self) -> None:
+        """Restart the deadline timeline on the next frame"""
+        self.deadline = None
+
+    def advance(self, fps: float) -> float:
+        """Move on to the next frame deadline
+
+        Args:
+            fps (float): Target frame rate of the current effect
+
+        Returns:
+            float: Seconds left until the next frame is due, 0 if it is already late
+        """
+        now = self.clock()
+        period = 1 / fps
+        self.frames += 1
+
+        if self.deadline is None or fps != self.fps:  # first frame or new rate
+            self.fps = fps
+            self.deadline = now + period
+            return period
+
+        self.deadline += period
+        delay = self.deadline - now
+        if delay >= 0:
+            return delay
+
+        self.late_frames += 1
+        missed = int(-delay // period)
+        if missed >= self.max_lag:  # too far behind to catch up, drop the missed frames
+            self.dropped_frames += missed
+            self.deadline += missed * period
+        return 0.0
+
+    def wait(self, fps: float) -> None:
+        """Sleep until the next frame deadline
+
+        Args:
+            fps (float): Target frame rate of the current effect
+        """
+        delay = self.advance(fps)
+        if delay > 0:
+            self.sleep(delay)
@@ -0,0 +1,56 @@
+"""Frames streamed from another host
+
+A stream packet is packed pixels, bpp bytes each in r, g, b(, w) order
+whatever the strip's pixel order, optionally after a header:
+
+    sequence number (uint16), first pixel (uint16), both little endian
+
+Packets without a header are whole frames from pixel 0. Every packet of a
+frame split into several carries the same sequence number, packets older
+than the last one received are dropped. Packets are parsed with struct
+only, they never go through JSON.
+"""
+
+import struct
+
+HEADER = struct.Struct("<HH")
+# packets up to this many sequence numbers behind the last one are stale,
+# further back is taken as a sender that started over
+STALE_WINDOW = 1024
+
+
+def unpack(payload, header: bool) -> tuple:
+    """Split a packet
+
+    Args:
+        payload (bytes-like): Packet
+        header (bool): The packet starts with a header
+
+    Raises:
+        ValueError: The packet is shorter than a header
+
+    Returns:
+        tuple: (sequence number or None, first pixel, memoryview of the pixel data)
+    """
+    data = memoryview(payload)
+    if not header:
+        return None, 0, data
+    if len(data) < HEADER.size:
+        raise ValueError(f"Stream packet of {len(data)} bytes has no header")
+    sequence, start = HEADER.unpack_from(data)
+    return sequence, start, data[HEADER.size:]
+
+
+def is_stale(sequence: int, last: int | None) -> bool:
+    """Check if a packet is older than the last one received
+
+    Args:
+        sequence (int): Sequence number of the packet
+        last (int | None): Sequence number of the last packet, None if there was none
+
+    Returns:
+        bool: The packet is from an older frame
+    """
+    if last is None:
+        return False
+    return 0 < (last - sequence) & 0xFFFF <= STALE_WINDOW
@@ -0,0 +1,117 @@
+"""Animator effect benchmark
+
+Runs every registered effect through Animator.cycle() on the headless
+neopixel_null driver with frame pacing disabled, and prints one JSON object
+per effect, strip length and pixel order. render_us and show_us are means
+over the frames actually rendered and shown, static effects render only
+when their args change, so they are null for those.
+
+Usage: python -m benchmarks.bench_effects [--lengths 50,200] [--orders RGB] [--output FILE]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import animator
+from animator.scheduler import FrameScheduler
+import neopixel_null
+
+
+def bench(effect: str, num_pixels: int, order: str, frames: int, **animator_kwargs) -> dict:
+    """Benchmark one effect
+
+    Args:
+        effect (str): Effect name
+        num_pixels (int): Strip length
+        order (str): Pixel order
+        frames (int): Number of frames to time
+
+    Returns:
+        dict: Results
+    """
+    random.seed(0)
+    pixels = neopixel_null.NeoPixel(None, num_pixels, auto_write=False, pixel_order=order)
+    animation_state = animator.AnimationState(state="ON", effect=effect, brightness=127)
+    anim = animator.Animator(
+        pixels, num_pixels, animation_state, animator.AnimationArgs(), **animator_kwargs
+    )
+    anim.scheduler = FrameScheduler(sleep=lambda _: None)
+    anim.realtime = False  # a whole animation step every frame, however fast frames come
+
+    for _ in range(min(frames, 10)):  # warm up
+        anim.cycle()
+
+    render, show = anim.metrics.render, anim.metrics.show
+    rendered, render_time, shown, show_time = render.count, render.sum, show.count, show.sum
+    start = time.perf_counter()
+    for _ in range(frames):
+        anim.cycle()
+    elapsed = time.perf_counter() - start
+    rendered, render_time = render.count - rendered, render.sum - render_time
+    shown, show_time = show.count - shown, show.sum - show_time
+
+    # highest transient allocation peak of a frame over what it started with, traced
+    # separately as tracing slows rendering, bytes still held after the frame are not told apart
+    tracemalloc.start()
+    alloc_peak = 0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        anim.cycle()
+        alloc_peak = max(alloc_peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "effect": effect,
+        "num_pixels": num_pixels,
+        "order": order,
+        "numpy": anim.use_numpy,
+        "fixed_point": anim.fixed_point,
+        "frame_cache_size": anim.frame_cache.max_size,
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),  # cycles, rendered or not
+        "rendered": rendered,
+        "render_us": round(render_time / rendered * 1e6, 2) if rendered else None,
+        "show_us": round(show_time / shown * 1e6, 2) if shown else None,
+        "peak_alloc_bytes": alloc_peak,
+        "shown": pixels.frame_count,
+    }
+
+
+def main() -> None:
+    "Run the benchmark"
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--effects", default=",".join(animator.EFFECTS))
+    parser.add_argument("--lengths", default="50,200,1000,5000")
+    parser.add_argument("--orders", default="RGB,GRBW")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--no-numpy", action="store_true")
+    parser.add_argument("--fixed-point", action="store_true")
+    parser.add_argument("--frame-cache-size", type=int, default=0)
+    parser.add_argument("--output", help="write results to a file instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for effect in args.effects.split(","):
+            for num_pixels in (int(length) for length in args.lengths.split(",")):
+                for order in args.orders.split(","):
+                    result = bench(
+                        effect, num_pixels, order, args.frames,
+                        use_numpy=not args.no_numpy,
+                        fixed_point=args.fixed_point,
+                        frame_cache_size=args.frame_cache_size,
+                    )
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Frame pipeline benchmark
+
+Runs an effect unpaced on the headless neopixel_null driver, with a
+simulated wire time of 30 us per pixel, transmitting on the render thread
+and with double and triple buffered pipelines. Prints one JSON object per
+strip length and pipeline depth. --render-time adds CPU time to every frame
+on the render thread, to see what a slower board gets.
+
+Usage: python -m benchmarks.bench_pipeline [--lengths 300,1000] [--depths 0,2,3]
+       [--effect Rainbow] [--render-time 0.02] [--output FILE]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+import animator
+from animator.scheduler import FrameScheduler
+import neopixel_null
+
+WIRE_TIME = 30e-6  # seconds per WS281x pixel
+
+
+def spin(seconds: float) -> None:
+    """Busy wait, holding the GIL like rendering does"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def bench(effect: str, num_pixels: int, depth: int, frames: int, use_numpy: bool,
+          render_time: float = 0.0) -> dict:
+    """Benchmark one strip length and pipeline depth
+
+    Args:
+        effect (str): Effect name
+        num_pixels (int): Strip length
+        depth (int): Pipeline buffers, 0 transmits on the render thread
+        frames (int): Number of frames to time
+        use_numpy (bool): Vectorized renderers
+        render_time (float, optional): Extra seconds of CPU time per frame. Defaults to 0.0.
+
+    Returns:
+        dict: Results
+    """
+    random.seed(0)
+    pixels = neopixel_null.NeoPixel(None, num_pixels, auto_write=False, pixel_order="GRB",
+                                    transmit_time=WIRE_TIME * num_pixels)
+    animation_state = animator.AnimationState(state="ON", effect=effect, brightness=127)
+    anim = animator.Animator(pixels, num_pixels, animation_state, animator.AnimationArgs(),
+                             use_numpy=use_numpy, pipeline=depth)
+    anim.scheduler = FrameScheduler(sleep=lambda _: None)
+
+    anim.cycle()  # warm up
+    if anim.pipeline is not None:
+        anim.pipeline.flush()
+    shown = pixels.frame_count
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        anim.cycle()
+        spin(render_time)
+    if anim.pipeline is not None:
+        anim.pipeline.flush()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "effect": effect,
+        "num_pixels": num_pixels,
+        "depth": depth,
+        "numpy": anim.use_numpy,
+        "frames": pixels.frame_count - shown,
+        "fps": round(frames / elapsed, 2),
+        "transmit_limit_fps": round(1 / (WIRE_TIME * num_pixels), 2),
+        "render_us": anim.metrics.render.summary()["p50"] + render_time * 1e6,
+    }
+    if anim.pipeline is not None:
+        result["stalls"] = anim.pipeline.stalls
+        anim.pipeline.close()
+    return result
+
+
+def main() -> None:
+    "Run the benchmark"
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--effect", default="Rainbow")
+    parser.add_argument("--lengths", default="100,300,1000")
+    parser.add_argument("--depths", default="0,2,3")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--no-numpy", action="store_true")
+    parser.add_argument("--render-time", type=float, default=0.0,
+                        help="extra seconds of CPU time per frame")
+    parser.add_argument("--output", help="write results to a file instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for num_pixels in (int(length) for length in args.lengths.split(",")):
+            for depth in (int(depth) for depth in args.depths.split(",")):
+                result = bench(args.effect, num_pixels, depth, args.frames, not args.no_numpy,
+                               args.render_time)
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
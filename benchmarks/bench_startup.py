@@ -0,0 +1,127 @@
+"""Startup time benchmark
+
+Starts mqtt_animator in fresh interpreters the way main() does, up to the
+first frame shown, and prints one JSON object per driver with the median
+times to import mqtt_animator, build the strips and show the boot frame,
+and the heavy modules loaded by then.
+
+Usage: python -m benchmarks.bench_startup [--drivers ddp,emulator] [--runs 5] [--effect Rainbow]
+       [--output FILE]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules worth loading only when they are used
+HEAVY_MODULES = ("numpy", "asyncio", "tcolorpy", "http.server", "neopixel_emu", "neopixel_net")
+
+DRIVERS = {
+    "ddp": {"network": {"protocol": "ddp", "targets": ["127.0.0.1:9"]}},
+    "e131": {"network": {"protocol": "e131", "targets": ["127.0.0.1:9"]}},
+    "emulator": {"virtual": True, "emulator": {"fast": True}},
+}
+
+
+def child(configuration: dict) -> dict:
+    """Start up in this interpreter
+
+    Args:
+        configuration (dict): Configuration, see config.yaml
+
+    Returns:
+        dict: Times in milliseconds and heavy modules loaded
+    """
+    start = time.perf_counter()
+    import mqtt_animator  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w", encoding="utf-8")):  # emulator output
+        system = mqtt_animator.AnimationSystem(configuration)
+        built = time.perf_counter()
+        system.boot()
+    shown = time.perf_counter()
+    return {
+        "import_ms": (imported - start) * 1e3,
+        "build_ms": (built - imported) * 1e3,
+        "boot_ms": (shown - built) * 1e3,
+        "first_frame_ms": (shown - start) * 1e3,
+        "modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def bench(driver: str, runs: int, num_pixels: int, effect: str | None) -> dict:
+    """Benchmark the startup with one driver
+
+    Args:
+        driver (str): Key of DRIVERS
+        runs (int): Number of interpreters started
+        num_pixels (int): Strip length
+        effect (str | None): Effect restored from a boot state file, None to start off
+
+    Returns:
+        dict: Results, medians of the runs
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        configuration = {"driver": {"num_pixels": num_pixels, **DRIVERS[driver]}}
+        if effect is not None:
+            state_file = os.path.join(directory, "state.json")
+            with open(state_file, "w", encoding="utf-8") as file:
+                json.dump({"MQTTAnimator": {"state": "ON", "brightness": 255,
+                                            "animation": effect, "args": {}}}, file)
+            configuration["boot"] = {"state_file": state_file}
+
+        results = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child",
+                 json.dumps(configuration)],
+                cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            result["process_ms"] = (time.perf_counter() - start) * 1e3
+            results.append(result)
+
+    summary: dict = {"driver": driver, "num_pixels": num_pixels, "effect": effect, "runs": runs}
+    for name in ("import_ms", "build_ms", "boot_ms", "first_frame_ms", "process_ms"):
+        summary[name] = round(statistics.median(result[name] for result in results), 2)
+    summary["modules"] = results[-1]["modules"]
+    return summary
+
+
+def main() -> None:
+    "Run the benchmark"
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", default="ddp,emulator")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--num-pixels", type=int, default=200)
+    parser.add_argument("--effect", help="effect restored from a boot state file")
+    parser.add_argument("--output", help="write results to a file instead of stdout")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(child(json.loads(args.child))))
+        return
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for driver in args.drivers.split(","):
+            result = bench(driver, args.runs, args.num_pixels, args.effect)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,218 +1,1061 @@
-"MQTT NeoPixel Animation System"
+"""MQTT NeoPixel Animation System
+
+Nothing is set up at import. main() reads the config, imports the drivers it
+names, shows the first frame, restored from the boot state file if there is
+one, and only then connects to MQTT. asyncio is only imported by the asyncio
+runtime.
+"""
 
 import json
 import logging
+import os
 import random
 import sys
-import time
 import threading
+import time
 import traceback
 import dataclasses
-
-try:
-    import board
-    import neopixel
-except NotImplementedError as e:
-    logging.error(f"Error importing NeoPixel driver {repr(e)}. If you are using the emulator, you can ignore this message.")
+from collections import OrderedDict
 
 import yaml
 from paho.mqtt import client as mqtt_client
 
 import animator
 from animator import AnimationArgs
-import neopixel_emu
+from animator.commands import CommandQueue
+from animator.compositor import Compositor, PixelView
+from animator import metrics
+from animator import stream
+from animator.effects import Stream
+
+@dataclasses.dataclass
+class Topics:
+    """MQTT topics of one segment"""
+    data_request: str = "MQTTAnimator/data_request"
+    state: str = "MQTTAnimator/state"
+    brightness: str = "MQTTAnimator/brightness"
+    args: str = "MQTTAnimator/args"
+    full_args: str = "MQTTAnimator/fargs"
+    animation: str = "MQTTAnimator/animation"
+    stream: str = "MQTTAnimator/stream"  # raw frames for the Stream effect
+
+    stats: str = "MQTTAnimator/stats"  # published, see StatsPublisher
+    data_request_return: str = "MQTTAnimator/rdata_request"
+    # retained, see StatePublisher
+    state_return: str = "MQTTAnimator/rstate"
+    anim_return: str = "MQTTAnimator/ranimation"
+    brightness_return: str = "MQTTAnimator/rbrightness"
+    args_return: str = "MQTTAnimator/rargs"  # one subtopic per animation
+    full_state_return: str = "MQTTAnimator/rfull_state"
+    governor_return: str = "MQTTAnimator/rgovernor"  # frame rate and governor decision
+
+    @classmethod
+    def from_config(cls, topics: dict) -> "Topics":
+        """Topics from the mqtt.topics config section"""
+        default = cls()
+        return cls(
+            data_request=topics.get("data_request_topic", default.data_request),
+            state=topics.get("state_topic", default.state),
+            brightness=topics.get("brightness_topic", default.brightness),
+            args=topics.get("args_topic", default.args),
+            full_args=topics.get("full_args_topic", default.full_args),
+            animation=topics.get("animation_topic", default.animation),
+            stream=topics.get("stream_topic", default.stream),
+            stats=topics.get("stats_topic", default.stats),
+            data_request_return=topics.get("return_data_request_topic",
+                                           default.data_request_return),
+            state_return=topics.get("return_state_topic", default.state_return),
+            anim_return=topics.get("return_anim_topic", default.anim_return),
+            brightness_return=topics.get("return_brightness_topic", default.brightness_return),
+            args_return=topics.get("return_args_topic", default.args_return),
+            full_state_return=topics.get("return_full_state_topic", default.full_state_return),
+            governor_return=topics.get("return_governor_topic", default.governor_return),
+        )
+
+    @classmethod
+    def with_prefix(cls, prefix: str) -> "Topics":
+        """Default topics moved under another prefix than MQTTAnimator"""
+        return cls(**{
+            name: prefix + "/" + topic.split("/", maxsplit=1)[1]
+            for name, topic in dataclasses.asdict(cls()).items()
+        })
+
+
+@dataclasses.dataclass
+class Reconnection:
+    """Backoff of MQTT reconnection attempts"""
+    first_delay: float = 1  # seconds
+    rate: float = 2  # delay multiplier after every failed attempt
+    max_count: int = 12  # attempts before exiting, 0 retries forever
+    max_delay: float = 60  # seconds
+
+    @classmethod
+    def from_config(cls, reconnection: dict) -> "Reconnection":
+        """Backoff from the mqtt.reconnection config section"""
+        default = cls()
+        return cls(
+            first_delay=reconnection.get("first_reconnect_delay", default.first_delay),
+            rate=reconnection.get("reconnect_rate", default.rate),
+            max_count=reconnection.get("max_reconnect_count", default.max_count),
+            max_delay=reconnection.get("max_reconnect_delay", default.max_delay),
+        )
 
-# Import yaml config
-with open("config.yaml", encoding="utf-8") as stream:
+
+def load_config(path: str = "config.yaml") -> dict:
+    """Read the YAML config, exits on parsing errors
+
+    Args:
+        path (str, optional): Config file. Defaults to "config.yaml".
+
+    Returns:
+        dict: Configuration
+    """
+    with open(path, encoding="utf-8") as file:
+        try:
+            return yaml.safe_load(file) or {}
+        except yaml.YAMLError as exc:
+            traceback.print_exc()
+            logging.critical("YAML Parsing Error, %s", exc)
+            sys.exit(0)
+
+
+def create_pixels(config: dict):
+    """Create the NeoPixel object of a strip
+
+    Args:
+        config (dict): Driver config
+
+    Returns:
+        neopixel.NeoPixel | neopixel_emu.NeoPixel | neopixel_net.E131 | neopixel_net.DDP:
+            Pixel object
+    """
+    length: int = config.get("num_pixels", 100)  # strip length
+    pixel_order = config.get("order", "RGB")  # Color order
+
+    # drivers are imported here, so that only the one in use is loaded
+    # pylint: disable=import-outside-toplevel
+    network_config: dict = config.get("network", {})
+    protocol: str = network_config.get("protocol", "").lower()
+    if protocol == "e131":
+        import neopixel_net
+        return neopixel_net.E131(
+            network_config.get("targets", []), length, brightness=1.0, auto_write=False,
+            pixel_order=pixel_order, universe=network_config.get("universe", 1)
+        )
+    if protocol == "ddp":
+        import neopixel_net
+        return neopixel_net.DDP(
+            network_config.get("targets", []), length, brightness=1.0, auto_write=False,
+            pixel_order=pixel_order
+        )
+
+    if config.get("virtual", False):
+        import neopixel_emu
+        emulator_config: dict = config.get("emulator", {})
+        return neopixel_emu.NeoPixel(
+            None, length, brightness=1.0, auto_write=False, pixel_order=pixel_order,
+            fast=emulator_config.get("fast", False),  # redraw in place, skip unchanged frames
+            max_refresh_rate=emulator_config.get("max_refresh_rate", 30)  # terminal refresh limit
+        )
     try:
-        configuration = yaml.safe_load(stream)
-    except yaml.YAMLError as exc:
-        traceback.print_exc()
-        logging.critical("YAML Parsing Error, %s", exc)
-        sys.exit(0)
-
-# logging config
-logging_config: dict = configuration.get("logging", {})
-logging_level: int = logging_config.get("level", 20)
-logging.basicConfig(level=logging_level)
-
-# mqtt config
-mqtt_config: dict = configuration.get("mqtt", {})
-mqtt_topics: dict = mqtt_config.get("topics", {})
-mqtt_reconnection: dict = mqtt_config.get("reconnection", {})
-
-mqtt_borker: str = mqtt_config.get("host", "localhost")
-mqtt_port: int = mqtt_config.get("port", 1883)
-client_id = f"mqtt-animator-{random.randint(0, 1000)}"
-
-data_request_topic: str = mqtt_topics.get("data_request_topic", "MQTTAnimator/data_request")
-state_topic: str = mqtt_topics.get("state_topic", "MQTTAnimator/state")
-brightness_topic: str = mqtt_topics.get("brightness_topic", "MQTTAnimator/brightness")
-args_topic: str = mqtt_topics.get("args_topic", "MQTTAnimator/args")
-full_args_topic: str = mqtt_topics.get("full_args_topic", "MQTTAnimator/fargs")
-animation_topic: str = mqtt_topics.get("animation_topic", "MQTTAnimator/animation")
-
-data_request_return_topic: str = mqtt_topics.get("return_data_request_topic",
-                                                 "MQTTAnimator/rdata_request")
-state_return_topic: str = mqtt_topics.get("return_state_topic", "MQTTAnimator/rstate")
-anim_return_topic: str = mqtt_topics.get("return_anim_topic", "MQTTAnimator/ranimation")
-brightness_return_topic: str = mqtt_topics.get("return_brightness_topic",
-                                               "MQTTAnimator/rbrightness")
-
-first_reconnect_delay: int = mqtt_reconnection.get("first_reconnect_delay", 1)
-reconnect_rate: int = mqtt_reconnection.get("reconnect_rate", 2)
-max_reconnect_count: int = mqtt_reconnection.get("max_reconnect_count", 12)
-max_reconnect_delay: int = mqtt_reconnection.get("max_reconnect_delay", 60)
-
-# NeoPixel driver config
-driver_config: dict = configuration.get("driver", {})
-
-virtual: bool = driver_config.get("virtual", False)
-num_pixels: int = driver_config.get("num_pixels", 100)  # strip length
-if not virtual:
-    pixel_pin = getattr(board, driver_config.get("pin", "D18"))  # rpi gpio pin
-else:
-    pixel_pin = None
-pixel_order = driver_config.get("order", "RGB")  # Color order
-
-global animation_args
-
-animation_args = animator.AnimationArgs()
-animation_args.single_color.color = (0, 255, 0)
-
-animation_state = animator.AnimationState()
-animation_state.brightness = 100
-
-# Create NeoPixel object
-if virtual:
-    pixels = neopixel_emu.NeoPixel(
-        pixel_pin, num_pixels, brightness=1.0, auto_write=False, pixel_order=pixel_order
-    )
-else:
-    pixels = neopixel.NeoPixel(
-        pixel_pin, num_pixels, brightness=1.0, auto_write=False, pixel_order=pixel_order # type: ignore
+        import board
+        import neopixel
+    except NotImplementedError as e:
+        logging.critical("Error importing NeoPixel driver %r. Set driver.virtual to use the "
+                         "emulator.", e)
+        raise
+    pixel_pin = getattr(board, config.get("pin", "D18"))  # rpi gpio pin
+    return neopixel.NeoPixel(
+        pixel_pin, length, brightness=1.0, auto_write=False, pixel_order=pixel_order # type: ignore
     )
-animator = animator.Animator(pixels, num_pixels, animation_state, animation_args)
 
-def validate_arg_import(json_data, dataclass_type):
-    # Convert the JSON data to a dictionary
-    data_dict = json.loads(json_data)
 
-    # Get the fields of the dataclass
-    class_fields = dataclasses.fields(dataclass_type)
+class StatePublisher:
+    """Publishes the state of a segment on retained topics, each field only when it changed
+
+    Every field is encoded once when it changes. The full state and the data
+    request reply are assembled from the encoded fields and kept until the
+    next change, so repeated data requests cost one publish of a cached payload.
+    """
+
+    def __init__(self, segment: "Segment") -> None:
+        self.segment = segment
+        self._published: dict = {}  # topic -> last retained payload
+        self._args: dict = {}  # animation -> encoded args
+        self._dirty_args = {field.name for field in dataclasses.fields(segment.animation_args)}
+        self._full_state: str | None = None
+        self._data_request_reply: str | None = None
+
+    def args_changed(self, animation: str) -> None:
+        """Mark the args of an animation for encoding on the next publish"""
+        self._dirty_args.add(animation)
+
+    def _retain(self, cli: "Connection", topic: str, payload: str) -> bool:
+        if self._published.get(topic) == payload:
+            return False
+        self._published[topic] = payload
+        cli.publish(topic, payload, retain=True)
+        return True
+
+    def publish(self, cli: "Connection") -> None:
+        """Publish the fields that changed since the last call"""
+        topics = self.segment.topics
+        animation_state = self.segment.animation_state
+
+        changed = self._retain(cli, topics.state_return, animation_state.state)
+        changed |= self._retain(cli, topics.brightness_return, str(animation_state.brightness))
+        changed |= self._retain(cli, topics.anim_return, animation_state.effect)
+        for field in dataclasses.fields(self.segment.animation_args):
+            if field.name not in self._dirty_args:
+                continue
+            payload = json.dumps(dataclasses.asdict(getattr(self.segment.animation_args,
+                                                            field.name)))
+            self._args[field.name] = payload
+            changed |= self._retain(cli, f"{topics.args_return}/{field.name}", payload)
+        self._dirty_args.clear()
+
+        if changed or self._full_state is None:
+            # same text as json.dumps(dataclasses.asdict(animation_args))
+            args = "{" + ", ".join(f'"{name}": {payload}'
+                                   for name, payload in self._args.items()) + "}"
+            head = (f'{{"state": {json.dumps(animation_state.state)}, '
+                    f'"brightness": {json.dumps(animation_state.brightness)}, '
+                    f'"animation": {json.dumps(animation_state.effect)}, "args": ')
+            tail = f', "num_leds": {self.segment.num_pixels}}}'
+            self._full_state = head + args + tail
+            # data requests get the args encoded again as a string, as they always did
+            self._data_request_reply = head + json.dumps(args) + tail
+            self._retain(cli, topics.full_state_return, self._full_state)
+
+        governor = self.segment.animator.governor
+        if governor is not None:
+            self._retain(cli, topics.governor_return,
+                         json.dumps({"fps": round(self.segment.animator.fps, 2),
+                                     **governor.decision}))
+
+    @property
+    def full_state(self) -> str | None:
+        """Full state as last published, None before the first publish"""
+        return self._full_state
+
+    def reply(self, cli: "Connection") -> None:
+        """Answer a data request with the cached state"""
+        self.publish(cli)
+        cli.publish(self.segment.topics.data_request_return, self._data_request_reply)
+
+
+class Segment:
+    """Independently animated strip, or run of pixels of one, with its own topics"""
+
+    def __init__(self, topics: Topics, pixels, length: int, **animator_options) -> None:
+        """
+        Args:
+            topics (Topics): Topics of the segment
+            pixels (neopixel.NeoPixel | neopixel_emu.NeoPixel | PixelView): Pixels to animate
+            length (int): Number of pixels
+            animator_options: Keyword arguments of animator.Animator
+        """
+        self.topics = topics
+        self.num_pixels = length
+
+        self.animation_args = animator.AnimationArgs()
+        self.animation_args.single_color.color = (0, 255, 0)
+
+        self.animation_state = animator.AnimationState()
+        self.animation_state.brightness = 100
+
+        self.animator = animator.Animator(pixels, length, self.animation_state,
+                                          self.animation_args, **animator_options)
+        self.state_publisher = StatePublisher(self)
+
+    @property
+    def name(self) -> str:
+        """Topic prefix of the segment"""
+        return self.topics.state.rsplit("/", maxsplit=1)[0]
+
+
+class BootState:
+    """Last state of every segment, kept in a small file to be shown again at startup
+
+    The strips light up with what they showed before a reboot or power cut
+    as soon as the drivers are loaded, without waiting for the broker.
+    Changes are written interval seconds after the first one, so a burst of
+    them, like a brightness slider being dragged, costs one write.
+    """
 
-    # Check if all the required fields are present in the JSON data
-    for field in class_fields:
-        field_name = field.name
-        if field_name not in data_dict:
+    def __init__(self, path: str, interval: float = 5.0, clock=time.monotonic) -> None:
+        """
+        Args:
+            path (str): State file
+            interval (float, optional): Seconds a change waits before it is written.
+                Defaults to 5.0.
+            clock (Callable, optional): Clock. Defaults to time.monotonic.
+        """
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._saved: str | None = None  # last text written or read
+        self._due: float | None = None  # time unsaved changes are written, None if there are none
+
+    def restore(self, segments: list) -> bool:
+        """Restore the state saved by save()
+
+        Args:
+            segments (list): Segments, matched by name
+
+        Returns:
+            bool: A state was restored
+        """
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                text = file.read()
+            saved = json.loads(text)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as err:
+            logging.warning("Can not restore boot state from %s: %s", self.path, err)
+            return False
+        if not isinstance(saved, dict):
+            logging.warning("Can not restore boot state from %s: not an object", self.path)
             return False
 
-        # If the field is a nested dataclass, recursively validate it
-        if hasattr(field.type, "__annotations__"):
-            if not validate_arg_import(json.dumps(data_dict[field_name]), field.type):
-                return False
+        for segment in segments:
+            state = saved.get(segment.name)
+            if not isinstance(state, dict):
+                continue
+            # a hand edited or damaged file must not keep the node from booting,
+            # values of the wrong type are skipped and keep their defaults
+            animation_state = segment.animation_state
+            for name, key in (("state", "state"), ("brightness", "brightness"),
+                              ("effect", "animation")):
+                self._restore_value(animation_state, name, state.get(key), segment.name)
+            args_state = state.get("args", {})
+            if not isinstance(args_state, dict):
+                logging.warning("Skipping args of %s in boot state, not an object", segment.name)
+                continue
+            for animation, values in args_state.items():
+                args = getattr(segment.animation_args, animation, None)
+                if not (dataclasses.is_dataclass(args) and isinstance(values, dict)):
+                    logging.warning("Skipping %s args of %s in boot state", animation, segment.name)
+                    continue
+                for key, value in values.items():
+                    if hasattr(args, key):
+                        self._restore_value(args, key, value, segment.name)
+        self._saved = text
+        logging.info("Restored boot state from %s", self.path)
+        return True
+
+    @staticmethod
+    def _restore_value(target, name: str, value, segment_name: str) -> None:
+        """Set an attribute to a restored value if it is of the same kind as the current one"""
+        if value is None:
+            return
+        current = getattr(target, name)
+        for kind in ((bool,), (int, float), (str,), (list, tuple)):
+            if isinstance(current, kind):
+                if isinstance(value, kind) and (kind == (bool,) or not isinstance(value, bool)):
+                    setattr(target, name, value)
+                    return
+                break
+        logging.warning("Skipping %s=%r of %s in boot state", name, value, segment_name)
+
+    def changed(self) -> None:
+        """Schedule a save, interval seconds after the first unsaved change"""
+        if self._due is None:
+            self._due = self.clock() + self.interval
+
+    def delay(self) -> float | None:
+        """Seconds until unsaved changes are written, None if there are none"""
+        if self._due is None:
+            return None
+        return max(self._due - self.clock(), 0.0)
+
+    def poll(self, segments: list) -> None:
+        """Save if due
+
+        Args:
+            segments (list): Segments
+        """
+        if self._due is not None and self.clock() >= self._due:
+            self.save(segments)
+
+    def save(self, segments: list) -> None:
+        """Write the published state of the segments now if it changed
+
+        Args:
+            segments (list): Segments
+        """
+        self._due = None
+        text = "{" + ", ".join(f"{json.dumps(segment.name)}: {segment.state_publisher.full_state}"
+                               for segment in segments) + "}"
+        if text == self._saved:
+            return
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(text)
+                file.flush()
+                os.fsync(file.fileno())  # survive a power cut right after a change
+            os.replace(temporary, self.path)
+        except OSError as err:
+            logging.warning("Can not save boot state to %s: %s", self.path, err)
+            return
+        self._saved = text
+
+
+class AnimationSystem:
+    """Strips, segments and render loop built from the config"""
+
+    def __init__(self, configuration: dict) -> None:
+        """
+        Args:
+            configuration (dict): Configuration, see config.yaml
+        """
+        # NeoPixel driver config
+        driver_config: dict = configuration.get("driver", {})
+        # More strips driven by the same process, options missing here are taken from driver
+        outputs_config: list = configuration.get("outputs", [])
+        # Independently animated runs of pixels, one for each whole strip if empty
+        segments_config: list = configuration.get("segments", [])
+        mqtt_topics: dict = configuration.get("mqtt", {}).get("topics", {})
+
+        # Animator config
+        animator_config: dict = configuration.get("animator", {})
+        animator_options = {
+            # vectorized renderers if NumPy is installed
+            "use_numpy": animator_config.get("numpy", True),
+            # bytes, 0 disables the cache
+            "frame_cache_size": animator_config.get("frame_cache_size", 0),
+            # frames per second, 0 for each effect's own, effects look the same at any rate
+            "frame_rate": animator_config.get("fps", 0),
+            "speed": animator_config.get("speed", 1.0),  # animation speed, 1 as designed
+            # integer math instead of floats where effects have it
+            "fixed_point": animator_config.get("fixed_point", False),
+            "calibration": animator.Calibration(
+                gamma=animator_config.get("gamma", 1.0),
+                white_balance=tuple(animator_config.get("white_balance", (1.0, 1.0, 1.0, 1.0))),
+            ),
+        }
+
+        # Create NeoPixel objects, strip 0 is the driver strip
+        self.strips = [create_pixels(driver_config)]
+        self.strips += [create_pixels({**driver_config, **output}) for output in outputs_config]
 
+        self.segments: list[Segment] = []
+        if segments_config:
+            for segment_config in segments_config:
+                strip = self.strips[segment_config.get("output", 0)]
+                start: int = segment_config.get("start", 0)
+                length: int = segment_config.get("length", len(strip) - start)
+                self.segments.append(Segment(Topics.with_prefix(segment_config["topic_prefix"]),
+                                             PixelView(strip, start, length), length,
+                                             **animator_options))
+        else:
+            self.segments.append(Segment(Topics.from_config(mqtt_topics), self.strips[0],
+                                         len(self.strips[0]), **animator_options))
+            for strip, output in zip(self.strips[1:], outputs_config):
+                self.segments.append(Segment(Topics.with_prefix(output["topic_prefix"]), strip,
+                                             len(strip), **animator_options))
+
+        # commands from the MQTT thread, applied by the render loop between frames
+        self.commands = CommandQueue()
+
+        # caps the frame rate of every segment when the loop can not keep up
+        governor_config: dict = animator_config.get("governor", {})
+        self.governor: animator.FrameRateGovernor | None = None
+        if governor_config.get("enabled", False):
+            self.governor = animator.FrameRateGovernor(
+                min_fps=governor_config.get("min_fps", 10.0),
+                max_fps=governor_config.get("max_fps", 120.0),
+                # share of the CPU time kept for the MQTT thread
+                reserve=governor_config.get("reserve", 0.25),
+            )
+        self.governor_decisions = 0  # decisions published
+
+        self.compositor = Compositor(
+            sleep=self.commands.ready.wait,  # wakes up early for commands
+            # buffers of strips transmitted on output threads, 0 transmits on the render thread
+            pipeline=animator_config.get("pipeline", 0),
+            governor=self.governor,
+        )
+        for segment in self.segments:
+            self.compositor.add(segment.animator)
+
+        # topic -> (segment, Topics field)
+        self.topic_routes: dict = {
+            topic: (segment, name)
+            for segment in self.segments
+            for name, topic in dataclasses.asdict(segment.topics).items()
+            if not name.endswith("_return") and name != "stats"
+        }
+
+        # last state shown again at startup, "" disables it
+        boot_config: dict = configuration.get("boot", {})
+        state_file: str = boot_config.get("state_file", "")
+        self.boot_state = None
+        if state_file:
+            # seconds changes wait before they are written, bursts of them are written once
+            self.boot_state = BootState(state_file, boot_config.get("save_interval", 5.0))
+
+        # stream packets start with a sequence number and first pixel, see animator.stream
+        self.stream_header: bool = configuration.get("stream", {}).get("header", False)
+
+    def boot(self) -> None:
+        """Restore the last state and show the first frame, before MQTT is connected"""
+        if self.boot_state is not None:
+            self.boot_state.restore(self.segments)
+        self.compositor.update()
+
+
+def validate_arg_import(data, dataclass_type) -> bool:
+    """Check full args against a dataclass, fields left out keep their current values
+
+    Args:
+        data (dict): Decoded full args
+        dataclass_type (type): Dataclass the args are for
+
+    Returns:
+        bool: data is an object of fields of the dataclass, nested dataclasses included
+    """
+    if not isinstance(data, dict):
+        return False
+    fields = {field.name: field for field in dataclasses.fields(dataclass_type)}
+    for name, value in data.items():
+        field = fields.get(name)
+        if field is None:
+            return False
+        # nested dataclasses are validated recursively, missing fields are fine at any depth
+        if dataclasses.is_dataclass(field.type) and not validate_arg_import(value, field.type):
+            return False
     return True
 
-def on_connect(_, __, ___, rc):
-    "On disconnection of mqtt"
-    if rc == 0:
+
+class Connection:
+    """MQTT connection that reconnects in the background
+
+    Network I/O runs on its own thread and never sleeps in a callback. When
+    the connection drops, reconnection attempts are scheduled on timers with
+    the exponential backoff from the mqtt.reconnection config. Publishes made
+    while disconnected are kept, the latest for each topic, and sent once
+    connected again, after every topic is subscribed again.
+    """
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    FAILED = "failed"
+
+    def __init__(self, client: mqtt_client.Client, host: str, port: int, topics: list,
+                 reconnection: Reconnection | None = None, on_failed=None,
+                 max_pending: int = 256) -> None:
+        """
+        Args:
+            client (mqtt_client.Client): Client, its on_connect and on_disconnect are replaced
+            host (str): Broker host
+            port (int): Broker port
+            topics (list): Topics to subscribe to on every connection
+            reconnection (Reconnection, optional): Backoff. Defaults to Reconnection().
+            on_failed (Callable, optional): Called after the last failed attempt. Defaults to None.
+            max_pending (int, optional): Publishes kept while disconnected. Defaults to 256.
+        """
+        self.client = client
+        self.topics = topics
+        self.reconnection = reconnection or Reconnection()
+        self.on_failed = on_failed
+        self.max_pending = max_pending
+
+        self.state = self.DISCONNECTED
+        self.attempts = 0
+        self.delay = self.reconnection.first_delay
+
+        self._lock = threading.Lock()
+        self._pending: OrderedDict = OrderedDict()  # topic -> (payload, retain)
+        self._socket_open = threading.Event()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.connect_async(host, port)
+
+    def start(self) -> None:
+        """Start the network thread and connect"""
+        threading.Thread(target=self._network_loop, name="MQTT_Updater", daemon=True).start()
+        self._schedule(0)
+
+    def publish(self, topic: str, payload, retain: bool = False) -> None:
+        """Publish now, or once connected again
+
+        Args:
+            topic (str): Topic
+            payload (str | bytes | int | float): Payload
+            retain (bool, optional): Retain flag. Defaults to False.
+        """
+        with self._lock:
+            if self.state == self.CONNECTED:
+                self.client.publish(topic, payload, retain=retain)
+                return
+            self._pending.pop(topic, None)
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+            self._pending[topic] = (payload, retain)
+
+    def _schedule(self, delay: float) -> None:
+        timer = threading.Timer(delay, self._attempt)
+        timer.daemon = True
+        timer.start()
+
+    def _attempt(self) -> None:
+        # before the socket opens: once it is, _on_connect can set CONNECTED at any time,
+        # on the event loop of AsyncioConnection even before reconnect() returns
+        with self._lock:
+            self.state = self.CONNECTING
+        try:
+            self.client.reconnect()
+        except OSError as err:  # ConnectionError, timeouts, DNS failures
+            logging.error("%s. Connection failed.", err)
+            self._retry()
+            return
+        self._socket_open.set()
+
+    def _retry(self) -> None:
+        self.attempts += 1
+        if self.reconnection.max_count and self.attempts >= self.reconnection.max_count:
+            self.state = self.FAILED
+            logging.critical("Reconnect failed after %s attempts. Exiting...", self.attempts)
+            if self.on_failed is not None:
+                self.on_failed()
+            return
+
+        self.state = self.DISCONNECTED
+        logging.info("Reconnecting in %g seconds...", self.delay)
+        self._schedule(self.delay)
+        self.delay = min(self.delay * self.reconnection.rate, self.reconnection.max_delay)
+
+    def _network_loop(self) -> None:
+        while True:
+            self._socket_open.wait()
+            rc = self.client.loop(timeout=1.0)
+            if rc != mqtt_client.MQTT_ERR_SUCCESS and self._socket_open.is_set():
+                self._on_disconnect(self.client, None, rc)
+
+    def _on_connect(self, _, __, ___, rc):
+        "On connection of mqtt"
+        if rc != 0:
+            logging.critical("Failed to connect, return code %d", rc)
+            return  # paho disconnects next, which schedules a retry
         logging.info("MQTT Connection Success")
-    else:
-        logging.critical("Failed to connect, return code %d\n", rc)
 
+        if self.topics:
+            self.client.subscribe([(topic, 0) for topic in self.topics])
+        with self._lock:
+            self.state = self.CONNECTED
+            self.attempts = 0
+            self.delay = self.reconnection.first_delay
+            pending = list(self._pending.items())
+            self._pending.clear()
+            for topic, (payload, retain) in pending:
+                self.client.publish(topic, payload, retain=retain)
+
+    def _on_disconnect(self, _, __, rc):
+        "On disconnection of mqtt"
+        if not self._socket_open.is_set():
+            return
+        self._socket_open.clear()
+        logging.info("Disconnected with result code: %s", rc)
+        with self._lock:
+            if self.state == self.CONNECTED:  # a working connection dropped, start over
+                self.attempts = 0
+                self.delay = self.reconnection.first_delay
+        self._retry()
+
+
+class AsyncioConnection(Connection):
+    """Connection driven by an asyncio event loop instead of threads
+
+    The socket is watched with add_reader/add_writer and keepalive runs as a
+    coroutine. Only the blocking TCP connect of an attempt runs in an executor.
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop", *args, **kwargs) -> None:
+        """
+        Args:
+            loop (asyncio.AbstractEventLoop): Event loop to run on, other args are
+                those of Connection
+        """
+        self.loop = loop
+        self._fd = -1
+        super().__init__(*args, **kwargs)
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def start(self) -> None:
+        """Start keepalive and connect"""
+        self.loop.create_task(self._misc_loop())
+        self._schedule(0)
+
+    def _schedule(self, delay: float) -> None:
+        # retries are scheduled from the executor when an attempt fails
+        self.loop.call_soon_threadsafe(
+            self.loop.call_later, delay, lambda: self.loop.create_task(self._attempt_async())
+        )
+
+    async def _attempt_async(self) -> None:
+        await self.loop.run_in_executor(None, self._attempt)
+
+    async def _misc_loop(self) -> None:
+        import asyncio  # pylint: disable=import-outside-toplevel
+        while True:
+            await asyncio.sleep(1)
+            if self._socket_open.is_set():
+                self.client.loop_misc()
 
-def on_disconnect(cli, _, rc):
-    "On connection of mqtt"
-    logging.info("Disconnected with result code: %s", rc)
-    reconnect_count, reconnect_delay = 0, first_reconnect_delay
-    while reconnect_count < max_reconnect_count:
-        logging.info("Reconnecting in %d seconds...", reconnect_delay)
-        time.sleep(reconnect_delay)
+    def _loop_read(self) -> None:
+        rc = self.client.loop_read()
+        if rc != mqtt_client.MQTT_ERR_SUCCESS and self._socket_open.is_set():
+            self._on_disconnect(self.client, None, rc)
 
+    # socket callbacks may run in the executor during a connection attempt, and the
+    # socket is closed before the loop gets to it, so it is watched by descriptor
+    def _on_socket_open(self, _, __, sock) -> None:
+        self._fd = sock.fileno()
+        self.loop.call_soon_threadsafe(self.loop.add_reader, self._fd, self._loop_read)
+
+    def _on_socket_close(self, *_) -> None:
+        self.loop.call_soon_threadsafe(self.loop.remove_reader, self._fd)
+        self.loop.call_soon_threadsafe(self.loop.remove_writer, self._fd)
+
+    def _on_socket_register_write(self, client, *_) -> None:
+        self.loop.call_soon_threadsafe(self.loop.add_writer, self._fd, client.loop_write)
+
+    def _on_socket_unregister_write(self, *_) -> None:
+        self.loop.call_soon_threadsafe(self.loop.remove_writer, self._fd)
+
+
+def on_message(_, system: AnimationSystem, msg):
+    "Callback for mqtt message recieved, queues the command for the render loop"
+    logging.debug("Received `%s` from `%s` topic", msg.payload, msg.topic)
+    try:
+        queue_message(system, msg)
+    except Exception:  # pylint: disable=broad-except
+        # raised out of the client's loop, it would end the network thread
+        logging.exception("Invalid message on `%s` topic", msg.topic)
+
+
+def queue_message(system: AnimationSystem, msg):
+    "Decode a message and queue its command for the render loop"
+    route = system.topic_routes.get(msg.topic)
+    if route is None:
+        return
+    segment, kind = route
+    commands = system.commands
+
+    if kind == "stream":  # binary frames, not decoded
         try:
-            cli.reconnect()
-            logging.info("Reconnected successfully!")
+            sequence, start, data = stream.unpack(msg.payload, system.stream_header)
+        except ValueError as err:
+            logging.debug("Invalid stream packet: %s", err)
             return
-        except ConnectionError as err:
-            logging.error("%s. Reconnect failed. Retrying...", err)
-
-        reconnect_delay *= reconnect_rate
-        reconnect_delay = min(reconnect_delay, max_reconnect_delay)
-        reconnect_count += 1
-    logging.info(
-        "Reconnect failed after %s attempts. Exiting...", reconnect_count
-    )  # Set Connecting Client ID
-
-
-def on_message(cli: mqtt_client.Client, __, msg):
-    global animation_args
-    
-    "Callback for mqtt message recieved"
-    logging.debug(f"Received `{msg.payload.decode()}` from `{msg.topic}` topic")
-
-    if msg.topic == data_request_topic:
-        publish_state(cli)
-    elif msg.topic == state_topic:
-        animation_state.state = "ON" if msg.payload.decode() == "ON" else "OFF"
-        cli.publish(state_return_topic, "ON" if msg.payload.decode() == "ON" else "OFF")
-    elif msg.topic == brightness_topic:
-        if msg.payload.decode().isdigit():
-            animation_state.brightness = int(msg.payload.decode())
-            cli.publish(brightness_return_topic, int(msg.payload.decode()))
+        # only the latest packet for each run of pixels is kept until the next frame
+        commands.put((segment, "stream", start), (sequence, data))
+        return
+
+    payload = msg.payload.decode()
+
+    if kind == "data_request":
+        commands.put((segment, "data_request"))
+    elif kind == "state":
+        commands.put((segment, "state"), "ON" if payload == "ON" else "OFF")
+    elif kind == "brightness":
+        if payload.isdigit():
+            commands.put((segment, "brightness"), int(payload))
         else:
-            logging.warning("Invalid brightness data: %s", msg.payload.decode())
-    elif msg.topic == animation_topic:
-        animation_state.effect = msg.payload.decode()
-        cli.publish(anim_return_topic, animation_state.effect)
-    elif msg.topic == args_topic:
-        animation, data = msg.payload.decode().split(",", maxsplit=1)
+            logging.warning("Invalid brightness data: %s", payload)
+    elif kind == "animation":
+        commands.put((segment, "effect"), payload)
+    elif kind == "args":
+        animation, data = payload.split(",", maxsplit=1)
         data = json.loads(data)
 
-        argument = getattr(animation_args, animation)
+        if not hasattr(segment.animation_args, animation):
+            logging.warning("Invalid animation args: %s", animation)
+            return
 
         for key, value in data.items():
-            setattr(argument, key, value)
-    elif msg.topic == full_args_topic:
+            commands.put((segment, "args", animation, key), value)
+    elif kind == "full_args":
         try:
-            data = json.loads(msg.payload.decode("utf-8"))
+            data = json.loads(payload)
         except json.JSONDecodeError:
             return
 
-        if not validate_arg_import(data, animation_args):
+        if not validate_arg_import(data, AnimationArgs):
+            logging.warning("Invalid full animation args: %s", payload)
             return
 
-        animation_args = AnimationArgs(**json.loads(data))
+        for animation, values in data.items():
+            for key, value in values.items():
+                commands.put((segment, "args", animation, key), value)
 
-def publish_state(cli):
-    cli.publish(data_request_return_topic,
-                    json.dumps({"state": animation_state.state,
-                                "brightness": animation_state.brightness,
-                                "animation": animation_state.effect,
-                                "args": json.dumps(dataclasses.asdict(animation_args)),
-                                "num_leds": pixels.n
-                                })
-                    )
 
-if __name__ == "__main__":
-    # connect to mqtt server
-    client = mqtt_client.Client(client_id)
-    client.on_connect = on_connect
-    client.on_disconnect = on_disconnect
+def apply_commands(cli: Connection, system: AnimationSystem):
+    "Apply queued commands between frames, then publish what changed and answer data requests"
+    touched: dict = {}  # segment -> data requested
+    for (segment, kind, *path), value in system.commands.drain():
+        if kind == "stream":  # not part of the published state
+            effect = segment.animator.effect
+            sequence, data = value
+            if isinstance(effect, Stream) and effect.receive(sequence, path[0], data):
+                segment.animator.scheduler.reset()  # show it right away
+            continue
+
+        animation_state = segment.animation_state
+        touched[segment] = touched.get(segment, False) or kind == "data_request"
+        if kind == "data_request":
+            continue
+        segment.animator.scheduler.reset()  # render the change right away
+
+        if kind == "state":
+            animation_state.state = value
+        elif kind == "brightness":
+            animation_state.brightness = value
+        elif kind == "effect":
+            animation_state.effect = value
+        elif kind == "args":
+            animation, key = path
+            setattr(getattr(segment.animation_args, animation), key, value)
+            segment.state_publisher.args_changed(animation)
+
+    governor = system.governor
+    if governor is not None and governor.decisions != system.governor_decisions:
+        system.governor_decisions = governor.decisions
+        for segment in system.segments:  # every frame rate may have changed
+            touched.setdefault(segment, False)
+
+    for segment, data_requested in touched.items():
+        if data_requested:
+            segment.state_publisher.reply(cli)
+        else:
+            segment.state_publisher.publish(cli)
+    if touched and system.boot_state is not None:
+        system.boot_state.changed()
+
+
+def housekeeping(cli: Connection, system: AnimationSystem, stats: "StatsPublisher") -> float | None:
+    """Publish stats and save the boot state when due
+
+    Args:
+        cli (Connection): Connection stats are published on
+        system (AnimationSystem): System to report on and save
+        stats (StatsPublisher): Publisher of the stats topics
+
+    Returns:
+        float | None: Seconds until either is due next, None if neither is pending
+    """
+    stats.poll(cli)
+    delays = [stats.delay()]
+    if system.boot_state is not None:
+        system.boot_state.poll(system.segments)
+        delays.append(system.boot_state.delay())
+    delays = [delay for delay in delays if delay is not None]
+    return min(delays) if delays else None
+
+
+def shutdown(system: AnimationSystem):
+    "Save unsaved boot state and exit after MQTT failed for good"
+    if system.boot_state is not None:
+        system.boot_state.save(system.segments)
+    sys.exit(1)
+
+
+def segment_stats(system: AnimationSystem, segment: Segment) -> dict:
+    "Metrics of a segment and of the loop it runs in"
+    anim = segment.animator
+    commands = system.commands
+    return {
+        "effect": anim.effect.name or None,
+        "target_fps": anim.fps,
+        **anim.metrics.snapshot(),
+        "late_frames": anim.scheduler.late_frames,
+        "dropped_frames": anim.scheduler.dropped_frames,
+        "queue_depth": len(commands),
+        "commands_coalesced": commands.coalesced,
+        "commands_dropped": commands.dropped,
+        "loop": system.compositor.metrics.snapshot(),
+        "governor": None if system.governor is None else system.governor.snapshot(),
+    }
+
+
+def prometheus_samples(system: AnimationSystem) -> list:
+    "Metrics of every segment and of the loop, see animator.metrics.prometheus_text"
+    gauges: dict = {}
+
+    def add(name: str, labels: dict, value) -> None:
+        gauges.setdefault(name, []).append((name, labels, value))
+
+    for segment in system.segments:
+        anim = segment.animator
+        labels = {"segment": segment.name, "effect": anim.effect.name or "Off"}
+        add("animator_fps", labels, round(anim.metrics.fps(), 2))
+        add("animator_target_fps", labels, anim.fps)
+        for name in ("render", "show"):
+            for sample in metrics.histogram_samples(f"animator_{name}_seconds", labels,
+                                                    getattr(anim.metrics, name)):
+                add(*sample)
+        labels = {"segment": segment.name}
+        add("animator_frames_total", labels, anim.metrics.frames)
+        add("animator_late_frames_total", labels, anim.scheduler.late_frames)
+        add("animator_dropped_frames_total", labels, anim.scheduler.dropped_frames)
+
+    for name in ("render", "show", "sleep"):
+        for sample in metrics.histogram_samples(f"animator_loop_{name}_seconds", {},
+                                                getattr(system.compositor.metrics, name)):
+            add(*sample)
+    add("animator_command_queue_depth", {}, len(system.commands))
+    add("animator_commands_coalesced_total", {}, system.commands.coalesced)
+    add("animator_commands_dropped_total", {}, system.commands.dropped)
+    if system.governor is not None:
+        add("animator_governor_load", {}, round(system.governor.load, 3))
+        add("animator_governor_capped", {}, int(system.governor.cap is not None))
+        add("animator_governor_decisions_total", {}, system.governor.decisions)
+    return [sample for samples in gauges.values() for sample in samples]
+
+
+class StatsPublisher:
+    """Publishes the metrics of every segment on its stats topic every interval"""
+
+    def __init__(self, system: AnimationSystem, interval: float, clock=time.monotonic) -> None:
+        """
+        Args:
+            system (AnimationSystem): Segments to publish the metrics of
+            interval (float): Seconds between publishes, 0 disables publishing
+            clock (Callable, optional): Clock. Defaults to time.monotonic.
+        """
+        self.system = system
+        self.interval = interval
+        self.clock = clock
+        self.next = clock() + interval
+
+    def delay(self) -> float | None:
+        """Seconds until the next publish, None if disabled"""
+        if self.interval <= 0:
+            return None
+        return max(self.next - self.clock(), 0.0)
+
+    def poll(self, cli: Connection) -> None:
+        """Publish if due"""
+        if self.interval <= 0 or self.clock() < self.next:
+            return
+        self.next = self.clock() + self.interval
+        for segment in self.system.segments:
+            cli.publish(segment.topics.stats, json.dumps(segment_stats(self.system, segment)))
+
+
+def start_metrics(system: AnimationSystem, metrics_config: dict) -> StatsPublisher:
+    """Serve Prometheus metrics if configured
+
+    Args:
+        system (AnimationSystem): System to report on
+        metrics_config (dict): metrics config section
+
+    Returns:
+        StatsPublisher: Publisher of the stats topics
+    """
+    prometheus_port: int = metrics_config.get("prometheus_port", 0)  # 0 disables the endpoint
+    if prometheus_port:
+        metrics.serve_prometheus(prometheus_port, lambda: prometheus_samples(system))
+    # seconds, 0 disables stats topics
+    return StatsPublisher(system, metrics_config.get("interval", 10))
+
+
+def run_threaded(system: AnimationSystem, mqtt_config: dict, metrics_config: dict):
+    "Run MQTT on a network thread and render on the main thread"
+    commands = system.commands
+    compositor = system.compositor
+
+    # connect to mqtt server, reconnecting in the background
+    client = mqtt_client.Client(f"mqtt-animator-{random.randint(0, 1000)}", userdata=system)
     client.on_message = on_message
-    client.connect(mqtt_borker, mqtt_port)
-    client.subscribe(data_request_topic)
-    client.subscribe(state_topic)
-    client.subscribe(brightness_topic)
-    client.subscribe(animation_topic)
-    client.subscribe(args_topic)
-
-    publish_state(client)
-
-    # run mqtt background tasks in thread
-    threading.Thread(
-        target=client.loop_forever, name="MQTT_Updater", daemon=True
-    ).start()
-
-    while True:
-        animator.cycle()
+    connection = Connection(client, mqtt_config.get("host", "localhost"),
+                            mqtt_config.get("port", 1883), list(system.topic_routes),
+                            Reconnection.from_config(mqtt_config.get("reconnection", {})),
+                            on_failed=commands.ready.set)
+
+    for segment in system.segments:
+        segment.state_publisher.publish(connection)  # sent once connected
+
+    connection.start()
+    stats = start_metrics(system, metrics_config)
+
+    while connection.state != Connection.FAILED:
+        apply_commands(connection, system)
+        compositor.cycle()
+        delay = housekeeping(connection, system, stats)
+        if compositor.idle and not commands:  # static effects or off, sleep until a command
+            commands.ready.wait(delay)
+    shutdown(system)
+
+
+async def run_async(system: AnimationSystem, mqtt_config: dict, metrics_config: dict):
+    "Run MQTT I/O, rendering and keepalive as coroutines on one event loop"
+    import asyncio  # pylint: disable=import-outside-toplevel
+    commands = system.commands
+    compositor = system.compositor
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()  # commands arrive on this loop, through on_message
+    commands.on_put = wake.set
+
+    client = mqtt_client.Client(f"mqtt-animator-{random.randint(0, 1000)}", userdata=system)
+    client.on_message = on_message
+    connection = AsyncioConnection(loop, client, mqtt_config.get("host", "localhost"),
+                                   mqtt_config.get("port", 1883), list(system.topic_routes),
+                                   Reconnection.from_config(mqtt_config.get("reconnection", {})),
+                                   on_failed=lambda: loop.call_soon_threadsafe(wake.set))
+
+    for segment in system.segments:
+        segment.state_publisher.publish(connection)  # sent once connected
+
+    connection.start()
+    stats = start_metrics(system, metrics_config)
+
+    while connection.state != Connection.FAILED:
+        wake.clear()
+        apply_commands(connection, system)
+        delay = compositor.update()
+        pending = housekeeping(connection, system, stats)
+        if compositor.idle and not commands:  # static effects or off, sleep until a command
+            delay = pending
+        if delay is None or delay > 0:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if not compositor.idle:
+                compositor.metrics.sleep.add(time.perf_counter() - start)
+    shutdown(system)
+
+
+def main(config_path: str = "config.yaml"):
+    "Start the animation system from a config file"
+    configuration = load_config(config_path)
+
+    # logging config
+    logging_config: dict = configuration.get("logging", {})
+    logging.basicConfig(level=logging_config.get("level", 20))
+
+    system = AnimationSystem(configuration)
+    system.boot()  # light the strips before connecting, the broker may take a while
+
+    mqtt_config: dict = configuration.get("mqtt", {})
+    metrics_config: dict = configuration.get("metrics", {})
+    # "threaded" runs MQTT on its own thread, "asyncio" runs everything on one event loop
+    if configuration.get("runtime", "threaded") == "asyncio":
+        import asyncio  # pylint: disable=import-outside-toplevel
+        asyncio.run(run_async(system, mqtt_config, metrics_config))
+    else:
+        run_threaded(system, mqtt_config, metrics_config)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import math
+import shutil
+import sys
+import threading
+import time
+
 import tcolorpy
 import adafruit_pixelbuf
 
-__version__ = "0.1.0"
+__version__ = "0.2.0"
 
 RGB = "RGB"
 GRB = "GRB"
@@ -22,12 +28,36 @@ class NeoPixel(adafruit_pixelbuf.PixelBuf):
         bpp: int = 3,
         brightness: float = 1.0,
         auto_write: bool = True,
-        pixel_order: str = "RGB"
+        pixel_order: str = "RGB",
+        fast: bool = False,
+        max_refresh_rate: float = 30.0
     ):
+        """
+        Args:
+            fast (bool, optional): Redraw one line in place with cached escape sequences
+                instead of printing a new line every frame. Defaults to False.
+            max_refresh_rate (float, optional): Terminal refresh limit of fast mode,
+                0 for no limit. Defaults to 30.0.
+        """
         super().__init__(n, byteorder=pixel_order, brightness=brightness, auto_write=auto_write)
+        self.fast = fast
+        self.max_refresh_rate = max_refresh_rate
+
+        self._escapes: dict = {}
+        self._last_frame = None
+        self._last_write = 0.0
+        self._rows = 0
+        # frame held back by max_refresh_rate, drawn by a timer unless a newer one comes
+        self._pending = None
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
 
     def deinit(self) -> None:
-        pass
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = None
 
     def __enter__(self):
         return self
@@ -44,9 +74,67 @@ class NeoPixel(adafruit_pixelbuf.PixelBuf):
         """ Same as .show(), deprecated """
         self.show()
 
-    def _transmit(self, _: bytearray) -> None:
+    def _escape(self, pixel: bytes) -> str:
+        """ Escape sequence drawing one pixel, cached per color """
+        escape = self._escapes.get(pixel)
+        if escape is None:
+            white = pixel[self._byteorder[3]] if self._has_white else 0
+            r, g, b = (min(255, pixel[i] + white) for i in self._byteorder[:3])
+            escape = f"\x1b[38;2;{r};{g};{b}m█"
+            if len(self._escapes) >= 4096:
+                self._escapes.clear()
+            self._escapes[pixel] = escape
+        return escape
+
+    def _transmit_fast(self, buffer: bytearray) -> None:
+        frame = bytes(buffer[self._offset:self._offset + self._bytes])
+        with self._lock:
+            if frame == self._last_frame:
+                self._pending = None
+                return
+            now = time.monotonic()
+            wait = 0.0
+            if self.max_refresh_rate:
+                wait = 1 / self.max_refresh_rate - (now - self._last_write)
+            if wait > 0:  # too early, the last frame of a burst is drawn when the interval is over
+                self._pending = frame
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._pending = None
+            self._draw(frame, now)
+
+    def _flush(self) -> None:
+        """ Draw the frame held back by max_refresh_rate """
+        with self._lock:
+            self._timer = None
+            if self._pending is not None:
+                self._draw(self._pending, time.monotonic())
+                self._pending = None
+
+    def _draw(self, frame: bytes, now: float) -> None:
+        step = self._bpp
+        line = "".join([self._escape(frame[i:i + step]) for i in range(0, len(frame), step)])
+        cursor = f"\x1b[{self._rows}F" if self._rows else ""  # back to the previous frame
+        sys.stdout.write(f"{cursor}{line}\x1b[0m\n")
+        sys.stdout.flush()
+
+        self._rows = math.ceil(self._pixels / shutil.get_terminal_size().columns)
+        self._last_frame = frame
+        self._last_write = now
+
+    def _transmit(self, buffer: bytearray) -> None:
+        if self.fast:
+            self._transmit_fast(buffer)
+            return
+
+        # drawn from buffer, not self: a FramePipeline has swapped in the next frame already
+        step = self._bpp
+        r, g, b = self._byteorder[:3]
         termout = ""
-        for pixel in self:
-            termout += tcolorpy.tcolor("█", '#{:02x}{:02x}{:02x}'.format(*[int(i * self.brightness) for i in pixel]))
+        for i in range(self._offset, self._offset + self._bytes, step):
+            color = f"#{buffer[i + r]:02x}{buffer[i + g]:02x}{buffer[i + b]:02x}"
+            termout += tcolorpy.tcolor("█", color)
         print(termout)
-
@@ -0,0 +1,250 @@
+import logging
+import socket
+import struct
+import uuid
+
+import adafruit_pixelbuf
+
+__version__ = "0.1.0"
+
+RGB = "RGB"
+GRB = "GRB"
+RGBW = "RGBW"
+GRBW = "GRBW"
+
+E131_PORT = 5568
+DDP_PORT = 4048
+
+
+def parse_target(target, default_port: int) -> tuple:
+    """Address of a controller
+
+    Args:
+        target (str | tuple): "host", "host:port" or (host, port)
+        default_port (int): Port if none is given
+
+    Returns:
+        tuple: (host, port)
+    """
+    if isinstance(target, (tuple, list)):
+        return (target[0], int(target[1]))
+    host, _, port = target.rpartition(":") if ":" in target else (target, "", "")
+    return (host, int(port) if port else default_port)
+
+
+def resolve_target(target: tuple) -> tuple:
+    """IPv4 address of a controller, looked up once so that sending never does it
+
+    Args:
+        target (tuple): (host, port)
+
+    Raises:
+        ValueError: The host can not be resolved
+
+    Returns:
+        tuple: (address, port)
+    """
+    host, port = target
+    try:
+        return socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+    except socket.gaierror as err:
+        raise ValueError(f"Can not resolve controller {host}: {err}") from err
+
+
+class _NetworkPixels(adafruit_pixelbuf.PixelBuf):
+    """Pixels sent to remote controllers over UDP
+
+    Packets are built once with their headers filled in, show() copies pixel
+    data into them and sends every packet of the frame to every target in
+    one burst.
+    """
+    default_port = 0
+
+    def __init__(
+        self,
+        targets,
+        n: int,
+        *,
+        bpp: int = 3,
+        brightness: float = 1.0,
+        auto_write: bool = True,
+        pixel_order: str = "RGB",
+    ):
+        """
+        Args:
+            targets (str | tuple | list): Controller, or list of controllers sent the same
+                frames, see parse_target
+        """
+        if isinstance(targets, str) or (
+            isinstance(targets, tuple) and len(targets) == 2 and isinstance(targets[1], int)
+        ):
+            targets = [targets]
+        self.targets = [resolve_target(parse_target(target, self.default_port))
+                        for target in targets]
+        self._failing: set = set()  # targets the last frame could not be sent to
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)  # never stall the render loop on the network
+        self.dropped_packets = 0
+        super().__init__(n, byteorder=pixel_order, brightness=brightness, auto_write=auto_write)
+        # (packet, header size, first byte, last byte) of every packet of a frame
+        self._packets = self._build_packets(len(self._post_brightness_buffer) - self._offset)
+
+    def _build_packets(self, frame_size: int) -> list:
+        raise NotImplementedError
+
+    def _prepare(self, packet: bytearray, index: int) -> None:
+        """Update the header of a packet before it is sent"""
+
+    def deinit(self) -> None:
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.deinit()
+
+    def __repr__(self):
+        return "[" + ", ".join([str(x) for x in self]) + "]"
+
+    @property
+    def n(self) -> int:
+        """ Get the number of pixels """
+        return len(self)
+
+    def write(self) -> None:
+        """ Same as .show(), deprecated """
+        self.show()
+
+    def _transmit(self, buffer: bytearray) -> None:
+        frame = memoryview(buffer)[self._offset:]
+        for index, (packet, header, start, end) in enumerate(self._packets):
+            packet[header:header + end - start] = frame[start:end]
+            self._prepare(packet, index)
+        frame.release()
+
+        sendto = self.sock.sendto
+        for target in self.targets:
+            for packet, _, _, _ in self._packets:
+                try:
+                    sendto(packet, target)
+                except (BlockingIOError, InterruptedError):  # send buffer full, skip the packet
+                    self.dropped_packets += 1
+                except OSError as err:  # unreachable controller, the others still get the frame
+                    self.dropped_packets += 1
+                    if target not in self._failing:
+                        self._failing.add(target)
+                        logging.warning("Can not send to controller %s:%s: %s", *target, err)
+                    break
+            else:
+                if target in self._failing:
+                    self._failing.discard(target)
+                    logging.info("Sending to controller %s:%s again", *target)
+
+
+class E131(_NetworkPixels):
+    """E1.31 (sACN) output
+    Semi-compatible with the Adafruit CircuitPython Neopixel Module,
+    pixels are sent in consecutive universes, a pixel is never split between two
+    """
+    default_port = E131_PORT
+
+    def __init__(
+        self,
+        targets,
+        n: int,
+        *,
+        universe: int = 1,
+        priority: int = 100,
+        source_name: str = "NeoPixelAnimator",
+        **kwargs
+    ):
+        """
+        Args:
+            targets (str | tuple | list): Controller, or list of controllers sent the same
+                frames, see parse_target. Default port is 5568.
+            universe (int, optional): Universe of the first pixels. Defaults to 1.
+            priority (int, optional): 0 to 200. Source priority. Defaults to 100.
+            source_name (str, optional): Source name. Defaults to "NeoPixelAnimator".
+        """
+        self.universe = universe
+        self.priority = priority
+        self.source_name = source_name
+        self.cid = uuid.uuid4().bytes
+        self.sequence = 0
+        super().__init__(targets, n, **kwargs)
+
+    def _build_packets(self, frame_size: int) -> list:
+        channels = 512 // self._bpp * self._bpp  # whole pixels per universe
+        packets = []
+        for index, start in enumerate(range(0, frame_size, channels)):
+            end = min(start + channels, frame_size)
+            length = 126 + end - start
+            packet = bytearray(length)
+            struct.pack_into(
+                "!HH12sHI16s", packet, 0,
+                0x0010, 0x0000, b"ASC-E1.17", 0x7000 | (length - 16), 0x00000004, self.cid,
+            )
+            struct.pack_into(
+                "!HI64sBHBBH", packet, 38,
+                0x7000 | (length - 38), 0x00000002, self.source_name.encode("utf-8")[:63],
+                self.priority, 0, 0, 0, self.universe + index,
+            )
+            struct.pack_into(
+                "!HBBHHHB", packet, 115,
+                0x7000 | (length - 115), 0x02, 0xA1, 0x0000, 0x0001, 1 + end - start, 0x00,
+            )
+            packets.append((packet, 126, start, end))
+        return packets
+
+    def _prepare(self, packet: bytearray, index: int) -> None:
+        if index == 0:
+            self.sequence = (self.sequence + 1) & 0xFF
+        packet[111] = self.sequence
+
+    @property
+    def universes(self) -> int:
+        """Number of universes the pixels take"""
+        return len(self._packets)
+
+
+class DDP(_NetworkPixels):
+    """DDP (Distributed Display Protocol) output
+    Semi-compatible with the Adafruit CircuitPython Neopixel Module,
+    the last packet of a frame has the push flag set
+    """
+    default_port = DDP_PORT
+
+    def __init__(self, targets, n: int, *, destination: int = 1, max_payload: int = 1440, **kwargs):
+        """
+        Args:
+            targets (str | tuple | list): Controller, or list of controllers sent the same
+                frames, see parse_target. Default port is 4048.
+            destination (int, optional): Output device id on the controller. Defaults to 1.
+            max_payload (int, optional): Pixel data bytes per packet, rounded down to whole
+                pixels. Defaults to 1440.
+        """
+        self.destination = destination
+        self.max_payload = max_payload
+        self.sequence = 0
+        super().__init__(targets, n, **kwargs)
+
+    def _build_packets(self, frame_size: int) -> list:
+        payload = self.max_payload // self._bpp * self._bpp
+        data_type = 0x1B if self._has_white else 0x0B  # 8 bit RGBW or RGB
+        starts = range(0, frame_size, payload)
+        packets = []
+        for start in starts:
+            end = min(start + payload, frame_size)
+            packet = bytearray(10 + end - start)
+            flags = 0x40 | (0x01 if end == frame_size else 0x00)  # version 1, push on the last
+            struct.pack_into(
+                "!BBBBIH", packet, 0, flags, 0, data_type, self.destination, start, end - start
+            )
+            packets.append((packet, 10, start, end))
+        return packets
+
+    def _prepare(self, packet: bytearray, index: int) -> None:
+        if index == 0:
+            self.sequence = self.sequence % 15 + 1  # 1 to 15, 0 is unused
+        packet[1] = self.sequence
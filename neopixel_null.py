@@ -0,0 +1,67 @@
+import collections
+import time
+
+import adafruit_pixelbuf
+
+__version__ = "0.1.0"
+
+RGB = "RGB"
+GRB = "GRB"
+RGBW = "RGBW"
+GRBW = "GRBW"
+
+
+class NeoPixel(adafruit_pixelbuf.PixelBuf):
+    """Headless NeoPixel driver
+    Semi-compatible with the Adafruit CircuitPython Neopixel Module,
+    frames are discarded or recorded in memory instead of being sent anywhere
+    """
+
+    def __init__(
+        self,
+        pin,
+        n: int,
+        *,
+        bpp: int = 3,
+        brightness: float = 1.0,
+        auto_write: bool = True,
+        pixel_order: str = "RGB",
+        record: int = 0,
+        transmit_time: float = 0.0
+    ):
+        """
+        Args:
+            record (int, optional): Number of most recent frames to keep in frames,
+                0 discards every frame. Defaults to 0.
+            transmit_time (float, optional): Seconds every show() sleeps, like a strip
+                on the wire, about 30e-6 * n for WS281x. Defaults to 0.0.
+        """
+        self.frames: collections.deque = collections.deque(maxlen=record)
+        self.frame_count = 0
+        self.transmit_time = transmit_time
+        super().__init__(n, byteorder=pixel_order, brightness=brightness, auto_write=auto_write)
+
+    def deinit(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __repr__(self):
+        return "[" + ", ".join([str(x) for x in self]) + "]"
+
+    @property
+    def n(self) -> int:
+        """ Get the number of pixels """
+        return len(self)
+
+    def write(self) -> None:
+        """ Same as .show(), deprecated """
+        self.show()
+
+    def _transmit(self, buffer: bytearray) -> None:
+        if self.transmit_time:
+            time.sleep(self.transmit_time)
+        self.frame_count += 1
+        if self.frames.maxlen:
+            self.frames.append(bytes(buffer))
@@ -0,0 +1,46 @@
+"""Record an effect for playback with the Playback effect
+
+Renders on the headless driver as fast as possible, so a fast machine can
+record effects that a small one can not render in real time.
+
+Usage: python record_effect.py EFFECT FILE [--num-pixels 200] [--order GRB] [--frames 600]
+       [--args JSON]
+"""
+
+import argparse
+import json
+
+import animator
+from animator.recording import record
+import neopixel_null
+
+
+def main() -> None:
+    "Record an effect"
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("effect", choices=sorted(animator.EFFECTS))
+    parser.add_argument("path")
+    parser.add_argument("--num-pixels", type=int, default=200)
+    parser.add_argument("--order", default="GRB", help="pixel order of the strip it is played on")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--args", default="{}", help="effect options as JSON")
+    args = parser.parse_args()
+
+    pixels = neopixel_null.NeoPixel(None, args.num_pixels, auto_write=False, pixel_order=args.order)
+    animation_state = animator.AnimationState(state="ON", effect=args.effect, brightness=255)
+    animation_args = animator.AnimationArgs()
+    anim = animator.Animator(pixels, args.num_pixels, animation_state, animation_args)
+
+    effect_args = json.loads(args.args)
+    args_name = animator.EFFECTS[args.effect].args_name
+    if effect_args and args_name is None:
+        parser.error(f"{args.effect} has no options")
+    for key, value in effect_args.items():
+        setattr(getattr(animation_args, args_name), key, value)
+
+    count = record(anim, args.path, args.frames)
+    print(f"Recorded {count} frames of {args.effect} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()